@@ -0,0 +1,201 @@
+"""
+Benchmark for smarter views pipeline.
+
+Creates test database (in-memory for SQLite), fills it with pages and
+files and measures requests per second for generic views through test
+client, i.e. with middleware and urls resolving. Stats per pipeline
+step are collected by separate profiled pass. Results are printed or
+saved as JSON and can be compared with results for another commit:
+
+    ./manage.py benchmark --output=before.json
+    git checkout <other commit>
+    ./manage.py benchmark --compare=before.json
+"""
+import json
+import platform
+import subprocess
+import time
+from optparse import make_option
+from django.conf.urls import patterns, include, url
+from django.core.management.base import BaseCommand, CommandError
+import smarter
+from pages.views import PageViews, PageFileViews
+
+profile = smarter.ProfileAggregator()
+
+
+class ProfiledPageViews(PageViews):
+    defaults = dict(PageViews.defaults, profile=profile)
+
+
+class ProfiledPageFileViews(PageFileViews):
+    defaults = dict(PageFileViews.defaults, profile=profile)
+
+
+site = smarter.Site()
+site.register(PageViews)
+site.register(PageFileViews)
+
+profiled_site = smarter.Site(prefix='profiled')
+profiled_site.register(ProfiledPageViews)
+profiled_site.register(ProfiledPageFileViews)
+
+urlpatterns = patterns('',
+    url(r'^profiled/', include(profiled_site.urls)),
+    url(r'^', include(site.urls)),
+)
+
+
+class Command(BaseCommand):
+    help = "Measures smarter views performance."
+
+    option_list = BaseCommand.option_list + (
+        make_option('--rows', type='int', default=1000,
+                    help="Objects count for index views."),
+        make_option('--iterations', type='int', default=100,
+                    help="Requests count for every view."),
+        make_option('--models', type='int', default=150,
+                    help="Registered views count for site urls benchmark."),
+        make_option('--output', help="Save results to JSON file."),
+        make_option('--compare', help="Compare with results from JSON file."),
+    )
+
+    def handle(self, *args, **options):
+        from django.core.urlresolvers import clear_url_caches
+        from django.db import connection
+        from django.test.utils import override_settings
+
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            with override_settings(ROOT_URLCONF=__name__, DEBUG=False,
+                                   ALLOWED_HOSTS=['testserver']):
+                clear_url_caches()
+                results = self.run_views(options['rows'], options['iterations'])
+            results.update(self.run_site_urls(options['models'], options['iterations']))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            clear_url_caches()
+
+        output = {'meta': self.get_meta(options), 'results': results}
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(output, f, indent=2, sort_keys=True)
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.compare(json.load(f)['results'], results)
+        else:
+            self.stdout.write(json.dumps(output, indent=2, sort_keys=True))
+
+    def get_meta(self, options):
+        import django
+        try:
+            commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                             stderr=subprocess.STDOUT).strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'rows': options['rows'],
+            'iterations': options['iterations'],
+            'models': options['models'],
+        }
+
+    def run_views(self, rows, iterations):
+        from django.contrib.auth.models import User
+        from django.test.client import Client
+        from pages.models import Page, PageFile
+
+        owner = User.objects.create(username='bench')
+        Page.objects.bulk_create([Page(owner=owner, title='Page %s' % i, text='Text.')
+                                  for i in range(rows)])
+        page = Page.objects.all()[0]
+        PageFile.objects.bulk_create([PageFile(page=page, attachment='files/%s.txt' % i)
+                                      for i in range(rows)])
+
+        # Every remove request needs its own object, page with files is
+        # never removed, so files index is not empty and removing
+        # doesn't cascade.
+        removed = list(Page.objects.exclude(pk=page.pk)
+                                   .values_list('pk', flat=True)[:iterations * 2])
+        if len(removed) < iterations * 2:
+            raise CommandError("Rows count must be more than 2 x iterations.")
+        removed = iter(removed)
+
+        add_data = {'owner': owner.pk, 'title': 'New page', 'text': 'New text.'}
+        edit_data = {'title': 'Edited page', 'text': 'Edited text.'}
+        scenarios = (
+            ('index', 'get', 'page/', None, 200),
+            ('details', 'get', 'page/%s/' % page.pk, None, 200),
+            ('add-get', 'get', 'page/add/', None, 200),
+            ('add-post', 'post', 'page/add/', add_data, 302),
+            ('edit-post', 'post', 'page/%s/edit/' % page.pk, edit_data, 302),
+            ('remove', 'post', lambda: 'page/%s/remove/' % removed.next(), {}, 302),
+            ('pagefile-index', 'get', 'pagefile/', None, 200),
+        )
+
+        client, results = Client(), {}
+        for name, method, path, data, status in scenarios:
+            def _request(prefix):
+                r = getattr(client, method)('/%s%s' % (prefix, callable(path) and path() or path),
+                                            data or {})
+                if r.status_code != status:
+                    raise CommandError("%s: unexpected status %s" % (name, r.status_code))
+
+            start = time.time()
+            for i in range(iterations):
+                _request('')
+            seconds = time.time() - start
+
+            profile.reset()
+            for i in range(iterations):
+                _request('profiled/')
+            stages = {}
+            for (url_name, stage), total in profile.stats.items():
+                stages[stage] = {
+                    'ms': total['time'] * 1000 / total['count'],
+                    'queries': float(total['queries']) / total['count'],
+                }
+
+            results[name] = {
+                'requests': iterations,
+                'seconds': seconds,
+                'rps': iterations / seconds,
+                'stages': stages,
+            }
+        return results
+
+    def run_site_urls(self, models, iterations):
+        from pages.models import Page
+
+        views = [type('BenchViews%s' % i, (smarter.GenericViews,), {})
+                 for i in range(models)]
+        results = {}
+        for name, dispatcher in (('site-urls', False), ('site-urls-dispatcher', True)):
+            start = time.time()
+            for i in range(iterations):
+                s = smarter.Site(dispatcher=dispatcher)
+                for j, v in enumerate(views):
+                    s.register(v, Page, base_url='page%s/' % j, prefix='page%s' % j)
+                s.urls
+            seconds = time.time() - start
+            results[name] = {
+                'requests': iterations,
+                'seconds': seconds,
+                'rps': iterations / seconds,
+            }
+        return results
+
+    def compare(self, old, new):
+        self.stdout.write('%-24s %12s %12s %8s' % ('benchmark', 'old rps', 'new rps', 'change'))
+        for name in sorted(set(old) | set(new)):
+            old_rps = name in old and old[name]['rps'] or None
+            new_rps = name in new and new[name]['rps'] or None
+            if old_rps and new_rps:
+                change = '%+.1f%%' % ((new_rps / old_rps - 1) * 100)
+            else:
+                change = '-'
+            self.stdout.write('%-24s %12s %12s %8s' % (name,
+                old_rps and '%.1f' % old_rps or '-',
+                new_rps and '%.1f' % new_rps or '-', change))
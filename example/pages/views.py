@@ -21,6 +21,7 @@ class PageFileViews(smarter.GenericViews):
         'edit': None,
         'details': None,
         'add': {
-            'redirect': lambda view, request, **kwargs: view.get_url('index')
+            'redirect': lambda view, request, **kwargs: view.get_url('index'),
+            'upload': {'max_size': 10 * 2 ** 20}
         }
     }
\ No newline at end of file
@@ -6,11 +6,23 @@ django-smarter
 Copyright (c) 2013, Alexey Kinyov <rudy@05bit.com>
 Licensed under BSD, see LICENSE for more details.
 """
+import copy
+import functools
 import re
+import sys
+import threading
+import time
+import warnings
+from hashlib import md5
 from django.conf.urls import include, url
+from django.core.urlresolvers import RegexURLResolver, ResolverMatch, Resolver404
+from django.db.models.signals import post_save, post_delete
+from django.core.files.uploadhandler import (FileUploadHandler,
+    MemoryFileUploadHandler, StopUpload)
 from django.forms.models import modelform_factory, ModelForm
 from django.http import HttpResponse
-from django.shortcuts import get_object_or_404, render, redirect
+from django.http.response import HttpResponseBase
+from django.shortcuts import get_object_or_404, redirect
 
 
 class AlreadyRegistered(Exception):
@@ -18,6 +30,13 @@ class AlreadyRegistered(Exception):
     pass
 
 
+class TooManyQueries(UserWarning):
+    """Views debug warning: render has run more queries than
+    'max_queries' parameter allows.
+    """
+    pass
+
+
 class InvalidAction(Exception):
     """Views action error: action name must contain only latin
     letters and "_"/"-", can't start with "get_" or "_"/"-", can't
@@ -26,6 +45,13 @@ class InvalidAction(Exception):
     pass
 
 
+class VersionConflict(Exception):
+    """Form save error: object was changed by another request since
+    form was rendered, see 'version_field' parameter.
+    """
+    pass
+
+
 _baseconfig = {
     'index': {
         'url': r'',
@@ -42,27 +68,512 @@ _baseconfig = {
     'remove': {
         'url': r'(?P<pk>\d+)/remove/',
     },
+    'bulk-edit': {
+        'url': r'bulk-edit/',
+        'optional': True,
+    },
+    'bulk-remove': {
+        'url': r'bulk-remove/',
+        'optional': True,
+    },
+    'export': {
+        'url': r'export/',
+        'optional': True,
+    },
 }
 
 _action = '_action'
 
+_cache_key = '_smarter_cache_key'
+
+_conditional = '_smarter_conditional'
+
+_objects = '_smarter_objects'
+
+_permissions = '_smarter_permissions'
+
+# Cookie for reading from primary database after writes, see
+# GenericViews.get_using()
+_primary_cookie = 'smarter_primary'
+
+_safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+_cache = {
+    'timeout': 300,
+    'alias': 'default',
+    'vary_on_headers': (),
+    'vary_on_user': False,
+}
+
+_default_pipeline = ('init', '', 'perm', 'form', 'post', 'done')
+
+_paginate = {
+    'per_page': 20,
+    'max_per_page': 100,
+    'ordering': 'pk',
+    'keyset': False,
+}
+
+_upload = {
+    'max_size': None,
+    'memory_size': 0,
+    'chunk_size': 64 * 2 ** 10,
+}
+
+_search = {
+    'fields': (),
+    'param': 'q',
+    'backend': None,
+}
+
+# Search fields prefixes: '^' for prefix, '=' for exact match, '@' for
+# full-text search, no prefix for substring match.
+_search_lookups = {'^': 'startswith', '=': 'exact', '@': 'search'}
+
+# Lookups which can't use regular B-tree indexes.
+_unindexed_lookups = ('contains', 'icontains', 'endswith', 'iendswith',
+                      'iexact', 'istartswith', 'regex', 'iregex', 'week_day')
+
+
+def _freeze(value):
+    """Returns hashable version of option value: lists are
+    converted to tuples, other values are returned as is.
+    """
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def _get_cache(alias):
+    """Returns cache backend by alias."""
+    try:
+        from django.core.cache import caches
+        return caches[alias]
+    except ImportError:
+        from django.core.cache import get_cache
+        return get_cache(alias)
+
+
+def _generation_key(model, pk=None):
+    """Returns cache key for model or single object generation. Any
+    cached data for model or object must be keyed with generation
+    value, so changing it invalidates all cached data at once.
+    """
+    key = 'smarter:generation:%s.%s' % (model._meta.app_label,
+                                        model._meta.object_name.lower())
+    if pk is not None:
+        key = '%s:%s' % (key, pk)
+    return key
+
+
+def _get_generations(cache, keys, timeout):
+    """Returns dict with generation values for keys, missing values
+    are initialized, so evicted or expired generations never match
+    old data.
+    """
+    generations = cache.get_many(keys)
+    for key in keys:
+        if not key in generations:
+            cache.add(key, time.time(), timeout)
+            generations[key] = cache.get(key)
+    return generations
+
+
+# Cache aliases used for models with max cache timeouts, are filled on
+# views registration and init, see _register_cached_model().
+_cached_models = {}
+
+
+def _register_cached_model(model, options):
+    """Registers cache aliases from 'cache' and 'object_cache' in
+    options dicts for invalidation on model changes.
+    """
+    model = getattr(model._meta, 'concrete_model', model)
+    for params in options:
+        for name in ('cache', 'object_cache'):
+            cache = params and params.get(name)
+            if cache:
+                aliases = _cached_models.setdefault(model, {})
+                alias = cache.get('alias', _cache['alias'])
+                timeout = cache.get('timeout', _cache['timeout'])
+                if alias in aliases and (aliases[alias] is None or
+                                         timeout is not None and
+                                         timeout < aliases[alias]):
+                    continue
+                aliases[alias] = timeout
+
+
+def _generation_timeout(model, alias):
+    """Returns timeout for generations of model: max cache timeout for
+    model, so generations live as long as cached data. Expired
+    generation just makes cached data stale, see _get_generations().
+    """
+    return _cached_models.get(model, {}).get(alias, _cache['timeout'])
+
+
+def _invalidation_aliases(model):
+    """Returns cache aliases for invalidation of model: aliases used by
+    views for model and aliases from ``SMARTER_CACHE_ALIASES`` setting.
+    The setting is empty by default, it can be set for processes which
+    never create views, e.g. workers and management commands, so they
+    invalidate cache for any model too.
+    """
+    from django.conf import settings
+    aliases = set(_cached_models.get(model, ()))
+    aliases.update(getattr(settings, 'SMARTER_CACHE_ALIASES', ()))
+    return aliases
+
+
+def _invalidate_objects(model, pks):
+    """Invalidates cached data for objects and for their model."""
+    aliases = _invalidation_aliases(model)
+    if aliases:
+        now = time.time()
+        generations = {_generation_key(model): now}
+        for pk in pks:
+            generations[_generation_key(model, pk)] = now
+        for alias in aliases:
+            _get_cache(alias).set_many(
+                generations, _generation_timeout(model, alias))
+
+
+def _invalidate_cache(sender, instance, **kwargs):
+    """Signal handler: invalidates cached data for saved or deleted
+    object and for its model.
+    """
+    _invalidate_objects(getattr(sender._meta, 'concrete_model', sender),
+                        (instance.pk,))
+
+post_save.connect(_invalidate_cache, dispatch_uid='smarter-invalidate-cache')
+post_delete.connect(_invalidate_cache, dispatch_uid='smarter-invalidate-cache')
+
+
+def _literal_prefix(regex):
+    """Returns literal prefix of regular expression: all characters
+    before first special one, e.g. 'page/' for '^page/(?P<pk>\d+)/'.
+    Returns empty prefix for alternatives outside of groups, like
+    'edit|change/', and for inline flags, like '(?i)'.
+    """
+    depth, escaped, in_set = 0, False, False
+    for i, c in enumerate(regex):
+        if escaped:
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif in_set:
+            in_set = c != ']'
+        elif c == '[':
+            in_set = True
+        elif c == '(':
+            if regex[i + 1:i + 2] == '?' and regex[i + 2:i + 3] in tuple('iLmsux'):
+                return ''
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == '|' and not depth:
+            return ''
+
+    prefix = []
+    for c in regex.lstrip('^'):
+        if c in '.^$*+?{}[]\\|()':
+            # Quantifier makes previous character optional
+            if c in '*+?{' and prefix:
+                prefix.pop()
+            break
+        prefix.append(c)
+    return ''.join(prefix)
+
+
+def _url_template(regex):
+    """Returns format string and dict of compiled regular expressions
+    for named groups, e.g. ('%(pk)s/edit/', {'pk': re.compile(...)})
+    for '(?P<pk>\d+)/edit/'. Returns None if regex is not simple
+    enough to be converted to template.
+    """
+    regex = regex.lstrip('^')
+    if regex.endswith('$'):
+        regex = regex[:-1]
+    template, groups, i = [], {}, 0
+    while i < len(regex):
+        c = regex[i]
+        if c == '\\' and i + 1 < len(regex) and not regex[i + 1].isalnum():
+            template.append(regex[i + 1].replace('%', '%%'))
+            i += 2
+        elif regex.startswith('(?P<', i):
+            end, depth = i, 0
+            while end < len(regex):
+                if regex[end] == '(' and regex[end - 1] != '\\':
+                    depth += 1
+                elif regex[end] == ')' and regex[end - 1] != '\\':
+                    depth -= 1
+                    if depth == 0:
+                        break
+                end += 1
+            else:
+                return
+            name, group = regex[i + 4:end].split('>', 1)
+            groups[name] = re.compile('(?:%s)$' % group)
+            template.append('%%(%s)s' % name)
+            i = end + 1
+        elif c in '.^$*+?{}[]\\|()':
+            return
+        else:
+            template.append(c.replace('%', '%%'))
+            i += 1
+    return ''.join(template), groups
+
+
+class DispatchResolver(RegexURLResolver):
+    """
+    Urls resolver, which looks up patterns by their literal prefixes
+    in a trie instead of trying every pattern one by one. Patterns
+    are still tried in original order, so resolving result is the
+    same as for standard resolver, reversing works as usual.
+    """
+    def _get_trie(self):
+        try:
+            return self._trie
+        except AttributeError:
+            pass
+        trie = {}
+        for i, pattern in enumerate(self.url_patterns):
+            node = trie
+            for c in _literal_prefix(pattern.regex.pattern):
+                node = node.setdefault(c, {})
+            node.setdefault(None, []).append(i)
+        self._trie = trie
+        return trie
+
+    def _candidates(self, path):
+        node = self._get_trie()
+        found = list(node.get(None, ()))
+        for c in path:
+            node = node.get(c)
+            if node is None:
+                break
+            found.extend(node.get(None, ()))
+        found.sort()
+        patterns = self.url_patterns
+        return [patterns[i] for i in found]
+
+    def resolve(self, path):
+        tried = []
+        match = self.regex.search(path)
+        if not match:
+            raise Resolver404({'path': path})
+        new_path = path[match.end():]
+        for pattern in self._candidates(new_path):
+            try:
+                sub_match = pattern.resolve(new_path)
+            except Resolver404 as e:
+                sub_tried = e.args[0].get('tried')
+                if sub_tried is not None:
+                    tried.extend([[pattern] + t for t in sub_tried])
+                else:
+                    tried.append([pattern])
+            else:
+                if sub_match:
+                    kwargs = dict(match.groupdict(), **self.default_kwargs)
+                    kwargs.update(sub_match.kwargs)
+                    return ResolverMatch(sub_match.func, sub_match.args, kwargs,
+                                         sub_match.url_name,
+                                         self.app_name or sub_match.app_name,
+                                         [self.namespace] + sub_match.namespaces)
+                tried.append([pattern])
+        raise Resolver404({'tried': tried, 'path': new_path})
+
+
+class _Echo(object):
+    """File-like object, which returns written value, for streaming
+    output of ``csv.writer``.
+    """
+    def write(self, value):
+        return value
+
+
+def _iter_chunks(objects_list, fields, chunk_size):
+    """Yields values tuples for objects list, objects are fetched by
+    chunks of `chunk_size` ordered by primary key.
+    """
+    values_list = objects_list.order_by('pk').values_list('pk', *fields)
+    chunk = list(values_list[:chunk_size])
+    while chunk:
+        for row in chunk:
+            yield row[1:]
+        if len(chunk) < chunk_size:
+            break
+        chunk = list(values_list.filter(pk__gt=chunk[-1][0])[:chunk_size])
+
+
+def _matches(obj, lookup):
+    """Checks if object fields values are equal to lookup values, or
+    returns ``None`` if lookup is not just fields values.
+    """
+    from django.db.models import Model
+    from django.db.models.fields import FieldDoesNotExist
+    for k, v in lookup.items():
+        try:
+            field = k == 'pk' and obj._meta.pk or obj._meta.get_field(k)
+        except FieldDoesNotExist:
+            return
+        if isinstance(v, Model):
+            v = v.pk
+        if getattr(obj, field.attname) != v:
+            return False
+    return True
+
+
+def _compile_lookup(model, lookup, strict=False):
+    """Resolves lookup like 'owner__username__startswith' to target
+    field and lookup type. Raises exception for invalid lookup or, in
+    strict mode, for lookup which can't use database index.
+    """
+    from django.db.models.fields import FieldDoesNotExist
+    from django.db.models.sql.constants import QUERY_TERMS
+    parts, lookup_type, field = lookup.split('__'), 'exact', None
+    if len(parts) > 1 and parts[-1] in QUERY_TERMS:
+        lookup_type = parts.pop()
+    for name in parts:
+        if field is not None:
+            if not field.rel:
+                raise Exception("Invalid lookup %s for %s!" % (lookup, model))
+            model = field.rel.to
+        try:
+            field = name == 'pk' and model._meta.pk or model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise Exception("Invalid lookup %s for %s!" % (lookup, model))
+    if strict and (lookup_type in _unindexed_lookups or
+                   not (field.db_index or field.unique or field.primary_key)):
+        raise Exception("Lookup %s can't use index!" % lookup)
+    if field.rel:
+        field = field.rel.get_related_field()
+    return field, lookup_type
+
+
+def _lookup_value(field, lookup_type, values):
+    """Converts request values to Python value for lookup. Raises
+    ``ValueError``, ``TypeError`` or ``ValidationError`` for invalid
+    values.
+    """
+    if lookup_type == 'isnull' or (lookup_type == 'exact' and
+            field.get_internal_type() in ('BooleanField', 'NullBooleanField')):
+        return {'true': True, '1': True, 'false': False, '0': False}[values[-1].lower()]
+    if lookup_type in ('year', 'month', 'day', 'week_day'):
+        return int(values[-1])
+    if lookup_type in ('in', 'range'):
+        values = [v for value in values for v in value.split(',') if v]
+        if lookup_type == 'range' and len(values) != 2:
+            raise ValueError(values)
+        return [field.to_python(v) for v in values]
+    return field.to_python(values[-1])
+
+
+class _UploadLimitHandler(FileUploadHandler):
+    """Upload handler, which passes files data to next handlers and
+    stops upload when received data exceeds max size.
+    """
+    def __init__(self, request=None, max_size=None):
+        super(_UploadLimitHandler, self).__init__(request)
+        self.max_size, self.received, self.exceeded = max_size, 0, False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.max_size is not None and self.received > self.max_size:
+            self.exceeded = True
+            raise StopUpload(connection_reset=True)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+class _MemoryUploadHandler(MemoryFileUploadHandler):
+    """Upload handler, which keeps files in memory if request body is
+    not larger than max size.
+    """
+    def __init__(self, request=None, max_size=0):
+        super(_MemoryUploadHandler, self).__init__(request)
+        self.max_size = max_size
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.activated = content_length <= self.max_size
+
+
+def _upload_handlers(request, options):
+    """Returns upload handlers for request by 'upload' parameter."""
+    from django.core.files.uploadhandler import TemporaryFileUploadHandler
+    handlers = [_UploadLimitHandler(request, options['max_size'])]
+    if options['memory_size']:
+        handlers.append(_MemoryUploadHandler(request, options['memory_size']))
+    handlers.append(TemporaryFileUploadHandler(request))
+    for handler in handlers:
+        handler.chunk_size = options['chunk_size']
+    return handlers
+
+
+def _override_fields(fields, overrides, names):
+    """Applies 'labels', 'widgets', 'help_text' and 'required' overrides
+    to form fields with given names.
+    """
+    labels, widgets, help_text, required = overrides
+    for k in names:
+        field = fields[k]
+        if k in labels:
+            field.label = labels[k]
+        if k in widgets:
+            widget = widgets[k]
+            if isinstance(widget, type):
+                widget = widget()
+                extra_attrs = field.widget_attrs(widget)
+                if extra_attrs:
+                    widget.attrs.update(extra_attrs)
+                # Bind choices from original widget, they are lazy
+                # for model choice fields and are not evaluated here.
+                if hasattr(field.widget, 'choices'):
+                    widget.choices = field.widget.choices
+            if widget:
+                widget.is_required = field.required
+                field.widget = widget
+        if k in help_text:
+            field.help_text = help_text[k]
+        if k in required:
+            field.required = required[k]
+            field.widget.is_required = required[k]
+
+
+def _atomic(using=None):
+    """Returns transaction context manager for database."""
+    from django.db import transaction
+    if hasattr(transaction, 'atomic'):
+        return transaction.atomic(using=using)
+    return transaction.commit_on_success(using=using)
+
 
 class Site(object):
-    def __init__(self, prefix=None, delim='-'):
+    def __init__(self, prefix=None, delim='-', dispatcher=False):
         """
         Creates site object.
 
         Keyword arguments:
-        prefix  -- prefix for url names
-        delim   -- delimiter for url names, can be '_', '-' or empty string
+        prefix      -- prefix for url names
+        delim       -- delimiter for url names, can be '_', '-' or empty string
+        dispatcher  -- if True, urls are resolved by prefix trie instead
+                       of trying every url pattern one by one
         """
         if not delim in ('-', '-', ''):
             raise Exception("Delimiter must be in '-', '_' or empty string.")
         self._prefix = prefix
         self._delim = delim
-        self._registered = []
+        self._dispatcher = dispatcher
+
+        # Registrations list in order and registry dict by
+        # (model, views) key for fast lookups.
+        self._registered, self._registry = [], {}
 
-    def register(self, views, model=None, base_url=None, prefix=None):
+        # Views instances by (model, views) and memoized urls.
+        self._views, self._urls = {}, None
+
+    def register(self, views, model=None, base_url=None, prefix=None, using=None):
         """Register views.
 
         Views added with `base_url` and every view gets named url
@@ -84,6 +595,7 @@ class Site(object):
         model    -- model for views (overrides one defined in views class)
         base_url -- base url for views
         prefix   -- prefix in url names for urls resolver
+        using    -- database alias for read-only requests, e.g. replica
 
         Returns: None
         """
@@ -96,9 +608,8 @@ class Site(object):
         if base_url and not base_url.endswith('/'):
             raise Exception("`base_url` have to end with backslash ('/')")
 
-        for r in self._registered:
-            if r['model'] == model and r['views'] == views:
-                raise AlreadyRegistered()
+        if (model, views) in self._registry:
+            raise AlreadyRegistered()
 
         prefix_bits, model_name = [], model._meta.object_name.lower()
         if self._prefix:
@@ -116,21 +627,54 @@ class Site(object):
         else:
             base_url = '^%s/' % model_name
 
-        self._registered.append({
-                'base_url': base_url,
-                'prefix': self._delim.join(prefix_bits),
-                'delim': self._delim,
-                'model': model,
-                'views': views,
-            })
+        registration = {
+            'base_url': base_url,
+            'prefix': self._delim.join(prefix_bits),
+            'delim': self._delim,
+            'model': model,
+            'views': views,
+            'using': using,
+        }
+        self._registered.append(registration)
+        self._registry[(model, views)] = registration
+        _register_cached_model(model, [getattr(views, 'defaults', {})] +
+                                      getattr(views, 'options', {}).values())
+        self._urls = None
 
     @property
     def urls(self):
         """
-        Site urls.
+        Site urls, built once and rebuilt after new registrations.
+        """
+        if self._urls is None:
+            if self._dispatcher:
+                self._urls = [DispatchResolver(r'^', self.get_urls())]
+            else:
+                self._urls = self.get_urls()
+        return self._urls
+
+    def get_urls(self, *views_or_models):
         """
-        return [url(r['base_url'], include(r['views'](**r)._urls()))
-            for r in self._registered]
+        Returns urls for registered views. If views classes or models
+        are given, only urls for matching registrations are returned.
+
+        Views instances are created once and reused.
+        """
+        urls = []
+        for r in self._registered:
+            if (views_or_models and not r['views'] in views_or_models and
+                                    not r['model'] in views_or_models):
+                continue
+            key = (r['model'], r['views'])
+            try:
+                views = self._views[key]
+            except KeyError:
+                views = self._views[key] = r['views'](**r)
+            if self._dispatcher:
+                urls.append(DispatchResolver(r['base_url'], views._urls()))
+            else:
+                urls.append(url(r['base_url'], include(views._urls())))
+        return urls
 
 
 class GenericViews(object):
@@ -154,7 +698,7 @@ class GenericViews(object):
                      'obj' in kwargs and view.get_url('details', pk=kwargs['obj'].pk)
                                       or view.get_url('index')),
         'ajax': (lambda view, request, **kwargs:
-                 render(request, view.get_template(request), kwargs)),
+                 view._render(request, kwargs)),
     }
 
     def __init__(self, **kwargs):
@@ -171,13 +715,14 @@ class GenericViews(object):
 
         # Merge base, default and custom options to self._options dict
         # and skip disabled actions - for which options is explicitly
-        # set to None.
+        # set to None, and optional actions not defined in options.
         for action in set(_baseconfig.keys()).union(options.keys()):
             try:
                 if options[action] is None:
                     continue
             except KeyError:
-                pass
+                if _baseconfig[action].get('optional'):
+                    continue
 
             self._actions.append(action)
             self._options[action] = dict(_baseconfig.get(action, {}).items() +
@@ -192,21 +737,334 @@ class GenericViews(object):
                 print self._options
                 raise Exception("Undefined URL for action %s!" % action)
 
+        if 'bulk-edit' in self._actions and not self.get_param('bulk-edit', 'fields'):
+            raise Exception("Define 'fields' for bulk-edit action!")
+
         # Validate and setup other params
         if not kwargs['model']:
             raise Exception("No model specified for views!")
         self.model, self._delim, self._prefix = \
             kwargs['model'], kwargs['delim'], kwargs['prefix']
 
+        # Database alias for reads, unless overridden by 'using' option.
+        self._using = kwargs.get('using')
+
+        # Generated form classes cache.
+        self._form_classes = {}
+
+        # Selected templates cache, see _render(), and JSON serializers
+        # by fields, see _get_serializer()
+        self._templates, self._serializers = {}, {}
+        self._cache_templates = (getattr(self.get_template, 'im_func', None) is
+                                 GenericViews.get_template.im_func)
+
+        # Urls templates by action for fast reversing and urls prefixes
+        # for included views, which are resolved on first reversing.
+        self._url_templates, self._url_prefixes = {}, {}
+        base_url = kwargs.get('base_url')
+        base_template = base_url and _url_template(base_url)
+        if base_template and not base_template[1]:
+            for action in self._actions:
+                template = _url_template(self.get_param(action, 'url'))
+                if template:
+                    self._url_templates[action] = (
+                        base_template[0] + template[0], template[1])
+
+        # Invalidate responses and objects cache on model changes.
+        _register_cached_model(self.model, self._options.values())
+
+        # Filters by action as dict of params to lookups, target fields
+        # and lookup types, and search options with resolved lookups.
+        self._filters, self._search = {}, {}
+        for action in self._actions:
+            strict = self.get_param(action, 'strict_filters')
+            filters = self.get_param(action, 'filters')
+            if filters:
+                if not isinstance(filters, dict):
+                    filters = dict((f, f) for f in filters)
+                self._filters[action] = dict(
+                    (k, (v,) + _compile_lookup(self.model, v, strict))
+                    for k, v in filters.items())
+            search = self.get_param(action, 'search')
+            if search:
+                search = dict(_search, **search)
+                search['lookups'] = []
+                for f in search['fields']:
+                    lookup = '%s__%s' % (f.lstrip('^=@'),
+                                         _search_lookups.get(f[0], 'icontains'))
+                    field = _compile_lookup(self.model, lookup, strict)[0]
+                    search['lookups'].append((lookup, field))
+                if not (search['lookups'] or search['backend']):
+                    raise Exception("Define search 'fields' or 'backend' for %s!" % action)
+                self._search[action] = search
+
+        # Resolve pipelines to bound methods once, not per-request.
+        self._compiled = {}
+        self.compile_pipeline()
+
+    def compile_pipeline(self, action=None):
+        """
+        Resolves pipeline for action (or for all actions, if `action`
+        is None) to tuple of bound methods, so pipeline methods are
+        not looked up on every request. Call it again after patching
+        pipeline methods at runtime.
+
+        Actions with ``'compiled': False`` option are not compiled and
+        their pipelines are resolved per-request.
+        """
+        for a in (action and (action,) or self._actions):
+            if self.get_param(a, 'compiled', True):
+                self._compiled[a] = tuple(self._pipeline(a))
+            else:
+                self._compiled.pop(a, None)
+
     def get_param(self, request_or_action, name, default=None):
         action = getattr(request_or_action, _action, request_or_action)
         return self._options[action].get(name, default)
 
     def get_object(self, request, **kwargs):
-        return get_object_or_404(self.model, **kwargs)
+        """
+        Returns object by lookup kwargs or raises ``Http404``. Objects
+        are cached per-request by model and lookup, so all pipeline
+        steps and nested views get the same instance by one query, and
+        by 'object_cache' parameter objects are read through cache.
+        """
+        key = self._object_key(kwargs)
+        objects = getattr(request, _objects, None)
+        if objects is None and key is not None:
+            objects = {}
+            try:
+                setattr(request, _objects, objects)
+            except AttributeError:
+                # Action name is passed instead of request
+                key = None
+        if key is not None and key in objects:
+            return objects[key]
+
+        obj = self._load_object(request, key, kwargs)
+        if key is not None:
+            objects[key] = obj
+        return obj
 
     def get_objects_list(self, request, **kwargs):
-        return self.model.objects.filter(**kwargs)
+        queryset = self.get_queryset(request).filter(**kwargs)
+        if not isinstance(request, (str, unicode)):
+            queryset = self.filter_search(request,
+                queryset.filter(**self.get_filters(request)))
+        return self.filter_permitted(request, queryset)
+
+    def get_filters(self, request):
+        """
+        Returns lookups dict for values from ``request.GET`` by 'filters'
+        parameter. Raises ``ValidationError`` for invalid values.
+        """
+        from django.core.exceptions import ValidationError
+        filters = {}
+        action = getattr(request, _action)
+        for param, (lookup, field, lookup_type) in self._filters.get(action, {}).items():
+            values = [v for v in request.GET.getlist(param) if v]
+            if not values:
+                continue
+            try:
+                filters[lookup] = _lookup_value(field, lookup_type, values)
+            except (ValueError, TypeError, KeyError, ValidationError):
+                raise ValidationError({param: ["Invalid value."]})
+        return filters
+
+    def filter_search(self, request, queryset):
+        """
+        Returns queryset filtered by search query from ``request.GET``
+        by 'search' parameter. Every word of query must match any of
+        search fields, or query is passed to search backend. Words are
+        not matched against fields they're invalid values for.
+        """
+        from django.db.models import Q
+        search = self._search.get(getattr(request, _action))
+        query = search and request.GET.get(search['param'], '').strip()
+        if not query:
+            return queryset
+        if search['backend']:
+            return search['backend'](self, request, queryset, query)
+        from django.core.exceptions import ValidationError
+        for term in query.split():
+            q = Q()
+            for lookup, field in search['lookups']:
+                try:
+                    q |= Q(**{lookup: field.to_python(term)})
+                except ValidationError:
+                    pass  # e.g. not a number for integer field
+            if not q:
+                return queryset.none()
+            queryset = queryset.filter(q)
+        return queryset
+
+    def get_row_permissions(self, request):
+        """
+        Returns row-level permissions for request by 'row_permissions'
+        parameter: dict of lookups or ``Q`` object for permitted objects,
+        or ``None`` if all objects are permitted. Result is cached
+        per-request, so lists filtering and objects checks share it.
+
+        Permissions depend on request user, so if action name is passed
+        instead of request, e.g. by code outside of request, all objects
+        are permitted, like filters and search are not applied.
+        """
+        func = self.get_param(request, 'row_permissions')
+        if not func or isinstance(request, (str, unicode)):
+            return
+        permissions = getattr(request, _permissions, None)
+        if permissions is None:
+            permissions = {}
+            setattr(request, _permissions, permissions)
+        key = (self.model, func)
+        if not key in permissions:
+            permissions[key] = func(self, request)
+        return permissions[key]
+
+    def filter_permitted(self, request, queryset):
+        """
+        Returns queryset filtered by row-level permissions.
+        """
+        lookup = self.get_row_permissions(request)
+        if lookup is None:
+            return queryset
+        if isinstance(lookup, dict):
+            return queryset.filter(**lookup)
+        return queryset.filter(lookup)
+
+    def has_object_permission(self, request, obj):
+        """
+        Checks row-level permissions for object. Simple lookups by
+        fields values are checked without query.
+        """
+        lookup = self.get_row_permissions(request)
+        if lookup is None:
+            return True
+        if isinstance(lookup, dict):
+            matches = _matches(obj, lookup)
+            if matches is not None:
+                return matches
+        return self.filter_permitted(request,
+            self.get_queryset(request).filter(pk=obj.pk)).exists()
+
+    def get_queryset(self, request_or_action):
+        """
+        Returns base queryset for action or per-request shaped by
+        'select_related', 'prefetch_related', 'only' and 'defer'
+        parameters.
+        """
+        queryset = self.model.objects.all()
+        using = self.get_using(request_or_action)
+        if using:
+            queryset = queryset.using(using)
+        select_related = self.get_param(request_or_action, 'select_related')
+        if select_related is True:
+            queryset = queryset.select_related()
+        elif select_related:
+            queryset = queryset.select_related(*select_related)
+        prefetch_related = self.get_param(request_or_action, 'prefetch_related')
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        only = self.get_param(request_or_action, 'only')
+        if only:
+            queryset = queryset.only(*only)
+        defer = self.get_param(request_or_action, 'defer')
+        if defer:
+            queryset = queryset.defer(*defer)
+        return queryset
+
+    def get_using(self, request_or_action):
+        """
+        Returns database alias for reading objects by 'using' parameter
+        or ``using`` argument of ``Site.register()``, or ``None`` for
+        default routing. Requests with unsafe methods, e.g. POST to form
+        and remove actions, and requests in 'read_your_writes' seconds
+        after them use default (primary) database.
+        """
+        using = self.get_param(request_or_action, 'using', self._using)
+        method = getattr(request_or_action, 'method', None)
+        if using and method is not None:
+            if (method not in _safe_methods or
+                request_or_action.COOKIES.get(_primary_cookie)):
+                return None
+        return using
+
+    def get_objects_page(self, request, objects_list):
+        """
+        Returns single page of objects list for request according
+        to 'paginate' parameter. Two modes are supported: offset
+        pagination with ``?page=<number>`` and keyset pagination with
+        ``?after=<pk>`` / ``?before=<pk>``, which costs the same for
+        any page depth.
+
+        Result dict contains 'objects_list' for page, 'next_cursor' and
+        'prev_cursor' (page numbers or primary keys), 'next_page' and
+        'prev_page' query strings for links and, for offset mode,
+        'paginator' and 'page'.
+        """
+        from django.core.paginator import Paginator, InvalidPage
+        from django.http import Http404
+
+        paginate = dict(_paginate, **self.get_param(request, 'paginate'))
+        per_page = paginate['per_page']
+        try:
+            per_page = min(int(request.GET['per_page']),
+                           paginate['max_per_page'])
+        except (KeyError, ValueError):
+            pass
+        if per_page < 1:
+            per_page = paginate['per_page']
+
+        ordering = paginate['ordering']
+        if isinstance(ordering, (str, unicode)):
+            ordering = (ordering,)
+
+        if not paginate['keyset']:
+            if ordering:
+                objects_list = objects_list.order_by(*ordering)
+            paginator = Paginator(objects_list, per_page)
+            try:
+                page = paginator.page(request.GET.get('page', 1))
+            except InvalidPage:
+                raise Http404
+            return self._page_context(request, {
+                'objects_list': page.object_list,
+                'paginator': paginator,
+                'page': page,
+                'next_cursor': page.has_next() and page.next_page_number() or None,
+                'prev_cursor': page.has_previous() and page.previous_page_number() or None,
+            }, 'page')
+
+        if ordering not in (('pk',), ('-pk',)):
+            raise Exception("Keyset pagination supports only 'pk' or '-pk' ordering!")
+        desc = ordering[0].startswith('-')
+        after, before = request.GET.get('after'), request.GET.get('before')
+        try:
+            if after is not None:
+                objects_list = objects_list.filter(
+                    **{desc and 'pk__lt' or 'pk__gt': int(after)})
+            elif before is not None:
+                objects_list = objects_list.filter(
+                    **{desc and 'pk__gt' or 'pk__lt': int(before)})
+        except ValueError:
+            raise Http404
+
+        # Fetch one extra object to know if there's more in that direction.
+        if before is not None and after is None:
+            objects = list(objects_list.order_by(desc and 'pk' or '-pk')[:per_page + 1])
+            has_more, objects = len(objects) > per_page, objects[:per_page]
+            objects.reverse()
+            has_next, has_prev = True, has_more
+        else:
+            objects = list(objects_list.order_by(*ordering)[:per_page + 1])
+            has_more, objects = len(objects) > per_page, objects[:per_page]
+            has_next, has_prev = has_more, after is not None
+
+        return self._page_context(request, {
+            'objects_list': objects,
+            'next_cursor': has_next and objects and objects[-1].pk or None,
+            'prev_cursor': has_prev and objects and objects[0].pk or None,
+        }, 'after', 'before')
 
     def get_initial(self, request):
         initial_fields, initial = self.get_param(request, 'initial'), {}
@@ -243,65 +1101,96 @@ class GenericViews(object):
         #             yield t
         # return list(_sorted())
 
-    def get_form(self, request, **kwargs):
-        from django.forms.models import modelform_factory, ModelForm
-        
-        form_options = {'form': self.get_param(request, 'form')}
-        if form_options['form']:
-            form_options.update({
-                'exclude': self.get_param(request, 'exclude'),
-                'fields': self.get_param(request, 'fields'),
-            })
-            if issubclass(form_options['form'], ModelForm):
-                if (form_options['form'] == ModelForm and
-                    not form_options['fields'] and
-                    not form_options['exclude']):
-                        form_options['fields'] = '__all__'
-                form_class = modelform_factory(model=self.model,
-                                               **form_options)
-            else:
-                form_class = form_options['form']
+    def get_form_class(self, request_or_action):
+        """
+        Returns form class for action or per-request. Form classes are
+        generated once and cached by action, 'form', 'fields' and
+        'exclude' parameters. Override this method if form class really
+        needs to be built dynamically per-request.
+        """
+        action = getattr(request_or_action, _action, request_or_action)
+        form = self.get_param(action, 'form')
+        if not form:
+            return
+
+        fields = self.get_param(action, 'fields')
+        exclude = self.get_param(action, 'exclude')
+        key = (action, form, _freeze(fields), _freeze(exclude))
+        try:
+            return self._form_classes[key]
+        except KeyError:
+            pass
+
+        if issubclass(form, ModelForm):
+            if form == ModelForm and not fields and not exclude:
+                fields = '__all__'
+            form_class = modelform_factory(model=self.model, form=form,
+                                           fields=fields, exclude=exclude)
         else:
+            form_class = form
+        form_class = self._customize_form_class(action, form_class)
+        version = self.get_param(action, 'version_field')
+        if version:
+            from django import forms
+            form_class = type(form_class.__name__, (form_class,), {
+                version: forms.IntegerField(widget=forms.HiddenInput, required=False)})
+        self._form_classes[key] = form_class
+        return form_class
+
+    def get_form(self, request, **kwargs):
+        form_class = self.get_form_class(request)
+        if not form_class:
             return
 
         form_kwargs = kwargs.get('form', {})
         form_kwargs.setdefault('initial', self.get_initial(request))        
+        version = self.get_param(request, 'version_field')
+        instance = form_kwargs.get('instance')
+        if version and getattr(instance, 'pk', None) is not None:
+            form_kwargs['initial'] = dict(form_kwargs['initial'] or {},
+                                          **{version: getattr(instance, version)})
         if request.method == 'POST':
             form = form_class(data=request.POST, files=request.FILES, **form_kwargs)
         else:
             form = form_class(**form_kwargs)
-
-        for k, v in (self.get_param(request, 'labels') or {}).items():
-            form.fields[k].label = v
-        for k, v in (self.get_param(request, 'widgets') or {}).items():
-            # TODO: Not good, not good. It seems there's no clear
-            # way to redefine worm widgets dynamically, so we go
-            # tricky way here. Widget 'attrs' and 'choices' are
-            # bound to widget in form constructor, so we need to
-            # manually bind them again to our custom widgets.
-            # If you know, how to handle it better, you're
-            # welcome! // rudyryk
-            if isinstance(v, type):
-                widget = v()
-                extra_attrs = form.fields[k].widget_attrs(widget)
-                if extra_attrs:
-                    widget.attrs.update(extra_attrs)
-                if hasattr(form.fields[k], 'choices'):
-                    widget.choices = form.fields[k].choices
-            else:
-                widget = v
-            if widget:
-                form.fields[k].widget = widget
-        for k, v in (self.get_param(request, 'help_text') or {}).items():
-            form.fields[k].help_text = v
-        for k, v in (self.get_param(request, 'required') or {}).items():
-            form.fields[k].required = v
-
+        if version and getattr(getattr(form, 'instance', None), 'pk', 0) is None:
+            # New objects are saved with model default version
+            form.fields.pop(version, None)
         return form
 
     def get_url(self, action, *args, **kwargs):
+        """
+        Returns url for action. Urls for simple patterns are built by
+        substitution to precomputed template, and ``reverse()`` is
+        called only once per script prefix, urlconf and language.
+        """
         from django.core.urlresolvers import reverse
-        return reverse(self._url_name(action), args=args, kwargs=kwargs)
+        template = not args and self._url_templates.get(action)
+        if not template or len(kwargs) != len(template[1]):
+            return reverse(self._url_name(action), args=args, kwargs=kwargs)
+
+        from django.core.urlresolvers import get_script_prefix, get_urlconf
+        from django.utils.encoding import force_text
+        from django.utils.http import urlquote
+        from django.utils.translation import get_language
+
+        template, groups = template
+        subs = {}
+        for k, v in kwargs.items():
+            v = force_text(v)
+            if not k in groups or not groups[k].match(v):
+                return reverse(self._url_name(action), kwargs=kwargs)
+            subs[k] = urlquote(v, safe="/~:@!$&'()*+,;=")
+        path = template % subs
+
+        key = (get_script_prefix(), get_urlconf(), get_language())
+        try:
+            return self._url_prefixes[key] + path
+        except KeyError:
+            url = reverse(self._url_name(action), kwargs=kwargs)
+            if url.endswith(path):
+                self._url_prefixes[key] = url[:len(url) - len(path)]
+            return url
 
     def deny(self, request, message=None):
         from django.core.exceptions import PermissionDenied
@@ -317,16 +1206,38 @@ class GenericViews(object):
         pass
 
     def details__done(self, request, **kwargs):
-        return render(request, self.get_template(request), kwargs)
+        return (self._get_not_modified(request, kwargs) or
+                self._render(request, kwargs))
 
     def index(self, request, **kwargs):
-        return {'objects_list': self.get_objects_list(kwargs)}
+        objects_list = self.get_objects_list(request, **kwargs)
+        if self.get_param(request, 'paginate'):
+            return self.get_objects_page(request, objects_list)
+        return {'objects_list': objects_list}
 
     def index__form(self, request, **kwargs):
         pass
 
     def index__done(self, request, **kwargs):
-        return render(request, self.get_template(request), kwargs)
+        from django.conf import settings
+        not_modified = self._get_not_modified(request, kwargs)
+        if not_modified:
+            return not_modified
+
+        max_queries = self.get_param(request, 'max_queries')
+        if max_queries is None or not settings.DEBUG:
+            return self._render(request, kwargs)
+
+        from django.db import connection
+        start = len(connection.queries)
+        response = self._render(request, kwargs)
+        queries = len(connection.queries) - start
+        if queries > max_queries:
+            warnings.warn("Too many queries for %s: %s, expected %s at most. "
+                          "Consider 'select_related' or 'prefetch_related' "
+                          "option." % (request.path, queries, max_queries),
+                          TooManyQueries)
+        return response
 
     def remove(self, request, **kwargs):
         return {'obj': self.get_object(request, **kwargs)}
@@ -334,8 +1245,345 @@ class GenericViews(object):
     def remove__form(self, request, **kwargs):
         if request.method == 'POST':
             kwargs['obj'].delete()
+            objects = getattr(request, _objects, {})
+            for key, obj in objects.items():
+                if obj is kwargs['obj']:
+                    del objects[key]
+            return {'form_saved': True}
+
+    def bulk_edit(self, request, **kwargs):
+        return {'objects_list': self._get_bulk_objects(request, **kwargs)}
+
+    def bulk_edit__form(self, request, **kwargs):
+        """
+        Processes bulk edit form. Only fields chosen by 'update' list
+        from POST data are validated and updated, other fields are
+        removed from form, so nothing is updated without the list.
+        """
+        form = self.get_form(request)
+        if not form:
+            kwargs.pop('form', None)
+            return kwargs
+        kwargs['form'] = form
+        if form.is_bound:
+            chosen = request.POST.getlist('update')
+            for name in list(form.fields):
+                if not name in chosen:
+                    del form.fields[name]
+            if form.is_valid():
+                self._get_pipe(request, 'save')(request, **kwargs)
+                kwargs['form_saved'] = True
+        return kwargs
+
+    def bulk_edit__save(self, request, **kwargs):
+        """
+        Updates all objects by single query in transaction.
+        """
+        form, objects_list = kwargs['form'], kwargs['objects_list']
+        values = dict((f, form.cleaned_data[f]) for f in form.fields
+                      if f in form.cleaned_data)
+        if not values:
+            return
+        # Update doesn't send signals, so cached objects are
+        # invalidated explicitly.
+        model = getattr(self.model._meta, 'concrete_model', self.model)
+        with _atomic():
+            pks = (_invalidation_aliases(model) and
+                   list(objects_list.values_list('pk', flat=True)))
+            objects_list.update(**values)
+        if pks:
+            _invalidate_objects(model, pks)
+
+    def bulk_remove(self, request, **kwargs):
+        return {'objects_list': self._get_bulk_objects(request, **kwargs)}
+
+    def bulk_remove__form(self, request, **kwargs):
+        if request.method == 'POST':
+            with _atomic():
+                kwargs['objects_list'].delete()
             return {'form_saved': True}
 
+    def export(self, request, **kwargs):
+        return {'objects_list': self.get_objects_list(request, **kwargs)}
+
+    def export__form(self, request, **kwargs):
+        pass
+
+    def export__done(self, request, **kwargs):
+        """
+        Streams objects list as CSV or NDJSON (``?format=json``).
+        Objects are fetched by chunks ordered by primary key, so
+        memory usage doesn't depend on objects count.
+        """
+        from django.core.serializers.json import DjangoJSONEncoder
+        from django.http import Http404, StreamingHttpResponse
+        from django.utils.encoding import force_text
+        import csv
+        import json
+
+        format = request.GET.get('format', self.get_param(request, 'format', 'csv'))
+        if not format in ('csv', 'json'):
+            raise Http404
+        fields = (self.get_param(request, 'fields') or
+                  [f.name for f in self.model._meta.fields])
+        rows = _iter_chunks(kwargs['objects_list'], fields,
+                            self.get_param(request, 'chunk_size', 1000))
+
+        if format == 'json':
+            content_type = 'application/x-ndjson'
+            content = (json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder) + '\n'
+                       for row in rows)
+        else:
+            content_type = 'text/csv; charset=utf-8'
+            writer = csv.writer(_Echo())
+            def _csv():
+                yield writer.writerow(fields)
+                for row in rows:
+                    yield writer.writerow([force_text(v).encode('utf-8')
+                                           for v in row])
+            content = _csv()
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (
+            self.model._meta.object_name.lower(), format)
+        return response
+
+    def _get_bulk_objects(self, request, **kwargs):
+        """
+        Returns objects list for bulk actions filtered by 'pk' list
+        from request POST or GET data.
+        """
+        from django.core.exceptions import ValidationError
+        from django.http import Http404
+        data = request.method == 'POST' and request.POST or request.GET
+        try:
+            pks = [self.model._meta.pk.to_python(pk)
+                   for pk in data.getlist('pk') if pk]
+        except ValidationError:
+            raise Http404
+        return self.get_objects_list(request, pk__in=pks, **kwargs)
+
+    def _render(self, request, context):
+        """
+        Renders template for request with context. Selected template
+        objects are cached by action and AJAX flag, so template names
+        are not computed and loaders are not probed on every request.
+        Cache is not used in DEBUG mode or if ``get_template()`` is
+        overridden.
+        """
+        from django.conf import settings
+        from django.template import RequestContext, loader
+
+        if self._is_json(request):
+            return self._json_response(request, context)
+
+        key = (getattr(request, _action), request.is_ajax())
+        use_cache = self._cache_templates and not settings.DEBUG
+        template = use_cache and self._templates.get(key)
+        if not template:
+            names = self.get_template(request)
+            if isinstance(names, (str, unicode)):
+                template = loader.get_template(names)
+            else:
+                template = loader.select_template(names)
+            if use_cache:
+                self._templates[key] = template
+        return HttpResponse(template.render(RequestContext(request, context)),
+                            status=context.get('conflict') and 409 or 200)
+
+    def _is_json(self, request):
+        """
+        Checks if JSON response is enabled by 'json' parameter and
+        requested by ``?format=json`` or ``Accept`` header.
+        """
+        return bool(self.get_param(request, 'json') and
+                    (request.GET.get('format') == 'json' or
+                     'application/json' in request.META.get('HTTP_ACCEPT', '')))
+
+    def _json_response(self, request, context):
+        """
+        Returns JSON response with serialized 'obj', 'objects_list',
+        pagination cursors and form errors from context. Response
+        status is 400 if form has errors.
+        """
+        from django.core.serializers.json import DjangoJSONEncoder
+        from django.utils.cache import patch_vary_headers
+        import json
+
+        fields = self.get_param(request, 'json')
+        serialize = self._get_serializer(fields is not True and _freeze(fields) or None)
+        data, status = {}, 200
+        if context.get('obj') is not None:
+            data['obj'] = serialize(context['obj'])
+        if context.get('objects_list') is not None:
+            data['objects_list'] = [serialize(o) for o in context['objects_list']]
+            for k in ('next_cursor', 'prev_cursor'):
+                if k in context:
+                    data[k] = context[k]
+        form = context.get('form')
+        if getattr(form, 'is_bound', False) and form.errors:
+            data['errors'] = form.errors
+            status = context.get('conflict') and 409 or 400
+        if context.get('form_saved'):
+            data['form_saved'] = True
+
+        response = HttpResponse(json.dumps(data, cls=DjangoJSONEncoder),
+                                content_type='application/json', status=status)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    def _bad_request(self, request, errors):
+        """
+        Returns 400 response with errors dict, as JSON for JSON clients.
+        """
+        from django.http import HttpResponseBadRequest
+        import json
+        if self._is_json(request):
+            return HttpResponseBadRequest(json.dumps({'errors': errors}),
+                                          content_type='application/json')
+        return HttpResponseBadRequest('\n'.join('%s: %s' % (k, ' '.join(v))
+                                                for k, v in sorted(errors.items())))
+
+    def _get_serializer(self, fields=None):
+        """
+        Returns function for serializing model object to dict, field
+        accessors are resolved once for model and fields. Related
+        objects are serialized as primary keys and files as names.
+        """
+        from django.db.models import FileField
+        try:
+            return self._serializers[fields]
+        except KeyError:
+            pass
+
+        accessors = []
+        for f in self.model._meta.fields:
+            if fields and not f.name in fields:
+                continue
+            if isinstance(f, FileField):
+                convert = lambda value: value.name or None
+            else:
+                convert = None
+            accessors.append((f.name, f.attname, convert))
+
+        def serialize(obj):
+            data = {}
+            for name, attname, convert in accessors:
+                value = getattr(obj, attname)
+                if convert:
+                    value = convert(value)
+                data[name] = value
+            return data
+
+        self._serializers[fields] = serialize
+        return serialize
+
+    def _load_object(self, request, key, kwargs):
+        """
+        Returns object from database or, if 'object_cache' parameter is
+        set, from cache. Only objects looked up by primary key for GET
+        requests are cached, until object is changed. Cache key depends
+        on queryset options, so deferred or prefetched fields from other
+        actions are never mixed.
+        """
+        options = self.get_param(request, 'object_cache')
+        if not (options and key and len(key[1]) == 1 and key[1][0][0] == 'pk' and
+                getattr(request, 'method', None) in _safe_methods):
+            return get_object_or_404(self.get_queryset(request), **kwargs)
+        options = dict(_cache, **options)
+        cache = _get_cache(options['alias'])
+
+        model, pk = key[0], key[1][0][1]
+        generation = _generation_key(model, pk)
+        bits = [_get_generations(cache, [generation], _generation_timeout(
+                    model, options['alias']))[generation]]
+        for name in ('select_related', 'prefetch_related', 'only', 'defer'):
+            bits.append(_freeze(self.get_param(request, name)))
+        cache_key = 'smarter:object:%s.%s:%s:%s' % (
+            model._meta.app_label, model._meta.object_name.lower(), pk,
+            md5(repr(bits)).hexdigest())
+        obj = cache.get(cache_key)
+        if obj is None:
+            obj = get_object_or_404(self.get_queryset(request), **kwargs)
+            cache.set(cache_key, obj, options['timeout'])
+        return obj
+
+    def _object_key(self, kwargs):
+        """
+        Returns per-request objects cache key for lookup kwargs, primary
+        key values are normalized, so ``pk='1'`` and ``pk=1`` lookups
+        share cached object. Returns ``None`` if lookup is not hashable.
+        """
+        pk_field = self.model._meta.pk
+        lookup = []
+        for k, v in kwargs.items():
+            if k in ('pk', pk_field.name, pk_field.attname):
+                try:
+                    k, v = 'pk', pk_field.to_python(v)
+                except Exception:
+                    return
+            lookup.append((k, v))
+        key = (getattr(self.model._meta, 'concrete_model', self.model),
+               tuple(sorted(lookup)))
+        try:
+            hash(key)
+        except TypeError:
+            return
+        return key
+
+    def _page_context(self, request, context, next_param, prev_param=None):
+        """
+        Adds 'next_page' and 'prev_page' query strings to pagination
+        context, other GET parameters are preserved.
+        """
+        for cursor, param in (('next', next_param),
+                              ('prev', prev_param or next_param)):
+            value, query = context[cursor + '_cursor'], None
+            if value is not None:
+                query = request.GET.copy()
+                for p in ('page', 'after', 'before'):
+                    query.pop(p, None)
+                query[param] = value
+                query = '?' + query.urlencode()
+            context[cursor + '_page'] = query
+        return context
+
+    def _customize_form_class(self, action, form_class):
+        """
+        Returns subclass of form class with 'labels', 'widgets',
+        'help_text' and 'required' overrides applied to base fields,
+        or form class itself if there's nothing to override.
+        """
+        labels = self.get_param(action, 'labels') or {}
+        widgets = self.get_param(action, 'widgets') or {}
+        help_text = self.get_param(action, 'help_text') or {}
+        required = self.get_param(action, 'required') or {}
+        if not (labels or widgets or help_text or required):
+            return form_class
+
+        # Fields are copied to form instance on every form creation,
+        # so we're working on own copy of base fields here.
+        overrides = (labels, widgets, help_text, required)
+        names = set(labels) | set(widgets) | set(help_text) | set(required)
+        base_fields = copy.deepcopy(form_class.base_fields)
+        _override_fields(base_fields, overrides, names.intersection(base_fields))
+        form_class = type(form_class.__name__, (form_class,), {})
+        form_class.base_fields = base_fields
+
+        # Fields added in form's __init__ are overridden per-instance.
+        extra = names.difference(base_fields)
+        if extra:
+            def __init__(form, *args, **kwargs):
+                super(form_class, form).__init__(*args, **kwargs)
+                missing = extra.difference(form.fields)
+                if missing:
+                    raise Exception("Can't override unknown fields %s of "
+                                    "form for %s action!" % (
+                                    ', '.join(sorted(missing)), action))
+                _override_fields(form.fields, overrides, extra)
+            form_class.__init__ = __init__
+        return form_class
+
     def _urls(self):
         return [url(r'^' + self.get_param(action, 'url') + r'$',
                     self._view(action), name=self._url_name(action))
@@ -346,11 +1594,136 @@ class GenericViews(object):
 
     def _pipeline(self, action):
         """
-        View method pipeline.
+        View method pipeline. Tuple or list of names in pipeline is
+        a group of methods, which are called concurrently.
+        """
+        pipeline = []
+        for pipe in self.get_param(action, 'pipeline', _default_pipeline):
+            if isinstance(pipe, (list, tuple)):
+                pipes = tuple(self._get_pipe(action, p) for p in pipe)
+                pipeline.append(functools.partial(self._concurrent_pipe, pipes))
+            else:
+                pipeline.append(self._get_pipe(action, pipe))
+        return pipeline
+
+    def _pipeline_names(self, action):
+        """
+        View method pipeline steps names for profiling, the first
+        'real' step is named by action.
         """
-        default = ('init', '', 'perm', 'form', 'post', 'done')
-        return [self._get_pipe(action, pipe)
-            for pipe in self.get_param(action, 'pipeline', default)]
+        names = []
+        for pipe in self.get_param(action, 'pipeline', _default_pipeline):
+            if isinstance(pipe, (list, tuple)):
+                names.append('+'.join(p or action for p in pipe))
+            else:
+                names.append(pipe or action)
+        return names
+
+    def _profiled_pipeline(self, request, pipeline, kwargs):
+        """
+        Runs pipeline, measures time and database queries count for
+        every step and passes results to 'profile' sink. Adds
+        ``Server-Timing`` header to response if 'server_timing'
+        parameter is set.
+        """
+        from django.db import connections
+
+        # Queries are logged only with debug cursor
+        conns, debug_cursors = connections.all(), []
+        for conn in conns:
+            attr = (hasattr(conn, 'force_debug_cursor') and
+                    'force_debug_cursor' or 'use_debug_cursor')
+            debug_cursors.append((conn, attr, getattr(conn, attr)))
+            setattr(conn, attr, True)
+
+        action = getattr(request, _action)
+        stats, result, response = [], kwargs, None
+        try:
+            for name, pipe in zip(self._pipeline_names(action), pipeline):
+                queries = sum(len(c.queries) for c in conns)
+                start = time.time()
+                result = pipe(request, **result) or result
+                stats.append((name, time.time() - start,
+                              sum(len(c.queries) for c in conns) - queries))
+                if isinstance(result, HttpResponseBase):
+                    response = result
+                    break
+        finally:
+            for conn, attr, value in debug_cursors:
+                setattr(conn, attr, value)
+
+        sink = self.get_param(request, 'profile')
+        if sink:
+            sink(self, request, stats)
+        if response is not None:
+            self._pipe_response(request, response)
+            if self.get_param(request, 'server_timing'):
+                response['Server-Timing'] = ', '.join(
+                    '%s;dur=%.3f;desc="%s queries"' % (name, seconds * 1000, queries)
+                    for name, seconds, queries in stats)
+        return response
+
+    def _concurrent_pipe(self, pipes, request, **kwargs):
+        """
+        Calls pipeline methods group concurrently: first method is
+        called in current thread and others in separate threads, so
+        I/O bound methods, e.g. calling external services, don't wait
+        for each other.
+
+        All methods get the same arguments, threads get script prefix,
+        urlconf and language of current thread. The first ``HttpResponse``
+        is returned if any, otherwise dict results are merged in
+        pipeline order. Exceptions are re-raised in current thread.
+        """
+        from django.core.urlresolvers import (get_script_prefix, get_urlconf,
+                                              set_script_prefix, set_urlconf)
+        from django.utils import translation
+        results, errors = [None] * len(pipes), []
+
+        # Request thread-locals for reversing urls and translations.
+        script_prefix, urlconf = get_script_prefix(), get_urlconf()
+        language = translation.get_language()
+
+        def _call(i):
+            try:
+                results[i] = pipes[i](request, **kwargs)
+            except Exception:
+                errors.append((i, sys.exc_info()))
+
+        def _thread_call(i):
+            from django.db import connections
+            set_script_prefix(script_prefix)
+            set_urlconf(urlconf)
+            if language:
+                translation.activate(language)
+            try:
+                _call(i)
+            finally:
+                translation.deactivate()
+                # Don't leave connections opened by thread.
+                for conn in connections.all():
+                    conn.close()
+
+        threads = [threading.Thread(target=_thread_call, args=(i,))
+                   for i in range(1, len(pipes))]
+        for t in threads:
+            t.start()
+        _call(0)
+        for t in threads:
+            t.join()
+
+        if errors:
+            exc_type, exc_value, exc_traceback = min(errors)[1]
+            raise exc_type, exc_value, exc_traceback
+
+        merged = None
+        for result in results:
+            if isinstance(result, HttpResponseBase):
+                return result
+            if result:
+                merged = merged or dict(kwargs)
+                merged.update(result)
+        return merged
 
     def _get_pipe(self, request_or_action, name):
         """
@@ -365,6 +1738,188 @@ class GenericViews(object):
         else:
             return getattr(self, name % '_pipe')
 
+    def _get_cached_response(self, request, **kwargs):
+        """
+        Returns cached response for request if 'cache' parameter is set
+        for action and response is cached. Otherwise marks request, so
+        response will be cached after pipeline is done.
+
+        Responses for single object (with 'pk' in kwargs) are cached
+        until object is changed, other responses are cached until any
+        object of model is changed.
+
+        Cache is checked before **perm** step, so responses are always
+        cached per user if action has custom **perm** step or
+        'row_permissions' parameter is set.
+        """
+        options = self.get_param(request, 'cache')
+        if not options or not request.method in ('GET', 'HEAD'):
+            return
+        options = dict(_cache, **options)
+        cache = _get_cache(options['alias'])
+
+        # Keyed as invalidated on signals: by concrete model and by
+        # normalized primary key, so '01' and '1' share generation.
+        model = getattr(self.model._meta, 'concrete_model', self.model)
+        if 'pk' in kwargs:
+            try:
+                pk = model._meta.pk.to_python(kwargs['pk'])
+            except Exception:
+                return
+            generation = _generation_key(model, pk)
+        else:
+            generation = _generation_key(model)
+        bits = [_get_generations(cache, [generation], _generation_timeout(
+                    model, options['alias']))[generation],
+                sorted(kwargs.items()), request.get_full_path(),
+                request.is_ajax(), self._is_json(request)]
+        for header in options['vary_on_headers']:
+            bits.append(request.META.get(
+                'HTTP_' + header.upper().replace('-', '_')))
+        if options['vary_on_user'] or self._has_custom_perm(request):
+            bits.append(getattr(getattr(request, 'user', None), 'pk', None))
+
+        url_name = self._url_name(getattr(request, _action))
+        key = 'smarter:response:%s:%s' % (url_name, md5(repr(bits)).hexdigest())
+        response = cache.get(key)
+        if response is not None:
+            return response
+        setattr(request, _cache_key, (cache, key, options))
+
+    def _has_custom_perm(self, request):
+        """
+        Checks if per-object permissions are checked for request: by
+        **<action>__perm** method, overridden ``_pipe__perm()`` or by
+        'row_permissions' parameter.
+        """
+        action = getattr(request, _action)
+        return bool(hasattr(self, '%s__perm' % action.replace('-', '_')) or
+                    getattr(self._pipe__perm, 'im_func', None) is not
+                    GenericViews._pipe__perm.im_func or
+                    self.get_param(request, 'row_permissions'))
+
+    def _get_not_modified(self, request, kwargs, early=False):
+        """
+        Returns ``HttpResponseNotModified`` if GET request is conditional
+        and matches 'etag' or 'last_modified' parameters for action.
+
+        Early check is performed in **init** step by cheap query for
+        'last_modified' field, before object is loaded. If action has
+        custom **perm** step, check is deferred to **done** step, so
+        per-object permissions are checked first.
+
+        So 'etag' callable gets URL kwargs only for early check and
+        pipeline kwargs, e.g. 'obj' or 'objects_list', for deferred one.
+        """
+        from django.http import HttpResponseNotModified
+        from django.utils.http import parse_etags, parse_http_date_safe
+
+        if not request.method in ('GET', 'HEAD') or hasattr(request, _conditional):
+            return
+        etag = self.get_param(request, 'etag')
+        last_modified = self.get_param(request, 'last_modified')
+        if not (etag or last_modified):
+            return
+        if early and self._has_custom_perm(request):
+            return
+
+        if etag:
+            etag = etag(self, request, **kwargs)
+        if last_modified:
+            last_modified, list_etag = self._get_last_modified(
+                request, last_modified, kwargs)
+            etag = etag or list_etag
+        setattr(request, _conditional, (etag, last_modified))
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+        if if_none_match:
+            not_modified = etag is not None and (if_none_match.strip() == '*' or
+                                                 etag in parse_etags(if_none_match))
+        elif if_modified_since:
+            if_modified_since = parse_http_date_safe(if_modified_since)
+            not_modified = (last_modified is not None and
+                            if_modified_since is not None and
+                            last_modified <= if_modified_since)
+        else:
+            not_modified = False
+
+        if not_modified:
+            return HttpResponseNotModified()
+
+    def _get_last_modified(self, request, field, kwargs):
+        """
+        Returns last modified timestamp for object by 'last_modified'
+        field and ``None`` or ``(None, etag)`` for objects list, as
+        removed objects don't change max field value, so objects count
+        has to be considered too.
+        """
+        from calendar import timegm
+        from django.db.models import Count, Max
+
+        def _timestamp(value):
+            if value is not None:
+                return timegm(getattr(value, 'utctimetuple', value.timetuple)())
+
+        if 'obj' in kwargs:
+            return _timestamp(getattr(kwargs['obj'], field)), None
+
+        if 'objects_list' in kwargs:
+            objects_list = kwargs['objects_list']
+            if isinstance(objects_list, list):
+                values = [getattr(o, field) for o in objects_list]
+                bits = ([o.pk for o in objects_list], values and max(values))
+                return None, md5(repr(bits)).hexdigest()
+        elif 'pk' in kwargs:
+            values = list(self.get_queryset(request).filter(**kwargs).
+                          values_list(field, flat=True)[:1])
+            return values and _timestamp(values[0]) or None, None
+        else:
+            objects_list = self.get_objects_list(request, **kwargs)
+
+        bits = objects_list.aggregate(Count('pk'), Max(field))
+        return None, md5(repr(sorted(bits.items()))).hexdigest()
+
+    def _pipe_response(self, request, response):
+        """
+        Final response processing: sets conditional GET headers, sets
+        cookie for reading from primary database after writes and
+        caches response.
+        """
+        try:
+            etag, last_modified = getattr(request, _conditional)
+        except AttributeError:
+            pass
+        else:
+            from django.utils.http import http_date, quote_etag
+            if response.status_code in (200, 304):
+                if etag and not response.has_header('ETag'):
+                    response['ETag'] = quote_etag(etag)
+                if last_modified and not response.has_header('Last-Modified'):
+                    response['Last-Modified'] = http_date(last_modified)
+        if (request.method not in _safe_methods and response.status_code < 400 and
+            self.get_param(request, 'using', self._using)):
+            timeout = self.get_param(request, 'read_your_writes', 5)
+            if timeout:
+                response.set_cookie(_primary_cookie, '1', max_age=timeout)
+        self._cache_response(request, response)
+
+    def _cache_response(self, request, response):
+        """
+        Caches response if request was marked by ``_get_cached_response()``.
+        Responses with CSRF token or cookies are not cached.
+        """
+        try:
+            cache, key, options = getattr(request, _cache_key)
+        except AttributeError:
+            return
+        from django.utils.cache import patch_vary_headers
+        if (response.status_code == 200 and not response.cookies and
+            not getattr(response, 'streaming', False) and
+            not request.META.get('CSRF_COOKIE_USED')):
+            patch_vary_headers(response, options['vary_on_headers'])
+            cache.set(key, response, options['timeout'])
+
     def _pipe__init(self, request, **kwargs):
         """
         View initial step: check basic permissions, etc. Here can be
@@ -374,9 +1929,16 @@ class GenericViews(object):
         Checks base permissions before enter view, and if permissions
         are not sufficient returns ``self.deny(request)``.
         """
+        from django.core.exceptions import ValidationError
         perm = self.get_param(request, 'permissions')
         if perm and not request.user.has_perm(*perm):
             return self.deny(request)
+        try:
+            self.get_filters(request)
+        except ValidationError as e:
+            return self._bad_request(request, e.message_dict)
+        return (self._get_not_modified(request, kwargs, early=True) or
+                self._get_cached_response(request, **kwargs))
 
     def _pipe(self, request, **kwargs):
         """
@@ -390,19 +1952,29 @@ class GenericViews(object):
         """
         Checks extended per-object permissions.
         """
-        pass
+        obj = kwargs.get('obj')
+        if (obj is not None and obj.pk is not None and
+            not self.has_object_permission(request, obj)):
+            return self.deny(request)
 
     def _pipe__form(self, request, **kwargs):
         """
         Creates and processes form. If form is successfully saved,
-        there's ``'form_saved': True`` in result dict.
+        there's ``'form_saved': True`` in result dict, or ``'conflict':
+        True`` if object was changed by another request.
         """
         form = self.get_form(request, **kwargs)
         if form:
             kwargs['form'] = form
             if form.is_bound and form.is_valid():
-                kwargs['obj'] = self._get_pipe(request, 'save')(request, **kwargs)
-                kwargs['form_saved'] = True
+                try:
+                    kwargs['obj'] = self._get_pipe(request, 'save')(request, **kwargs)
+                    kwargs['form_saved'] = True
+                except VersionConflict as e:
+                    from django.forms.forms import NON_FIELD_ERRORS
+                    form._errors.setdefault(NON_FIELD_ERRORS,
+                                            form.error_class()).append(unicode(e))
+                    kwargs['conflict'] = True
             return kwargs
         else:
             kwargs.pop('form', None)
@@ -410,9 +1982,77 @@ class GenericViews(object):
 
     def _pipe__save(self, request, **kwargs):
         """
-        Saves form and returns saved object.
+        Saves form and returns saved object. If 'update_fields' parameter
+        is set, existing object is saved with changed fields only, and
+        if 'version_field' parameter is set, it's saved with version
+        check.
+        """
+        form = kwargs['form']
+        if getattr(form.instance, 'pk', None) is None:
+            return form.save()
+        version = self.get_param(request, 'version_field')
+        if version:
+            return self._save_versioned(request, form, version)
+        if self.get_param(request, 'update_fields'):
+            return self._save_changed(form)
+        return form.save()
+
+    def _save_versioned(self, request, form, version):
+        """
+        Saves model form instance with version check: conditional
+        ``UPDATE`` query increments version only if it's not changed
+        since form was rendered, then object is saved by regular
+        ``save()`` in the same transaction. So concurrent edits don't
+        override each other and rows are not locked in advance. Raises
+        ``VersionConflict`` if object version is changed.
+        """
+        from django.db import router
+        obj, expected = form.save(commit=False), form.cleaned_data.get(version)
+        if expected is None:
+            raise VersionConflict("Object version is missing.")
+        opts, model = obj._meta, obj.__class__
+        update_fields = None
+        if self.get_param(request, 'update_fields'):
+            changed = set(form.changed_data)
+            update_fields = [f.name for f in opts.fields
+                             if f.name in changed and f.name != version]
+            if update_fields:
+                update_fields += [f.name for f in opts.fields
+                                  if getattr(f, 'auto_now', False) and
+                                  not f.name in update_fields] + [version]
+
+        if update_fields is None or update_fields:
+            using = router.db_for_write(model, instance=obj)
+            with _atomic(using):
+                updated = model._base_manager.using(using).filter(
+                    pk=obj.pk, **{version: expected}).update(**{version: expected + 1})
+                if not updated:
+                    raise VersionConflict("Object was changed by another "
+                                          "request, please reload the page.")
+                setattr(obj, version, expected + 1)
+                obj.save(using=using, update_fields=update_fields)
+        if update_fields is None or set(form.changed_data).intersection(
+                f.name for f in opts.many_to_many):
+            form.save_m2m()
+        return obj
+
+    def _save_changed(self, form):
         """
-        return kwargs['form'].save()
+        Saves model form instance with ``update_fields`` by changed form
+        data, plus ``auto_now`` fields. Nothing is written and no signals
+        are sent if data is not changed.
+        """
+        obj, changed = form.save(commit=False), set(form.changed_data)
+        opts = obj._meta
+        update_fields = [f.name for f in opts.fields if f.name in changed]
+        if update_fields:
+            update_fields += [f.name for f in opts.fields
+                              if getattr(f, 'auto_now', False) and
+                              not f.name in update_fields]
+            obj.save(update_fields=update_fields)
+        if changed.intersection(f.name for f in opts.many_to_many):
+            form.save_m2m()
+        return obj
 
     def _pipe__post(self, request, **kwargs):
         """
@@ -427,6 +2067,11 @@ class GenericViews(object):
         View processing done: redirect if ``form_saved is ``True`` or
         render template.
         """
+        # JSON clients get data and form errors instead of redirects.
+        if self._is_json(request):
+            return (self._get_not_modified(request, kwargs) or
+                    self._json_response(request, kwargs))
+
         # AJAX has its own way!
         if request.is_ajax():
             ajax = self.get_param(request, 'ajax')
@@ -441,23 +2086,118 @@ class GenericViews(object):
             else:
                 return redirect(redirect_path)
 
-        return render(request, self.get_template(request), kwargs)
+        return (self._get_not_modified(request, kwargs) or
+                self._render(request, kwargs))
 
     def _view(self, action):
+        profiled = (self.get_param(action, 'profile') or
+                    self.get_param(action, 'server_timing'))
+
         def inner(request, **kwargs):
             # return HttpResponse(action)
             setattr(request, _action, action)
             result = kwargs
-            for pipe in self._pipeline(action):
+            pipeline = self._compiled.get(action)
+            if pipeline is None:
+                pipeline = self._pipeline(action)
+            if profiled:
+                return self._profiled_pipeline(request, pipeline, kwargs)
+            for pipe in pipeline:
                 result = pipe(request, **result) or result
-                if isinstance(result, HttpResponse):
+                if isinstance(result, HttpResponseBase):
+                    self._pipe_response(request, result)
                     return result
         
+        # Upload is handled inside decorators, so e.g. login_required
+        # rejects request before body is read.
+        upload = self.get_param(action, 'upload')
+        if upload:
+            inner = self._upload_view(action, inner)
+
         for d in self.get_param(action, 'decorators') or ():
             inner = d(inner)
 
+        if upload:
+            from django.views.decorators.csrf import csrf_exempt
+            inner = csrf_exempt(inner)
+
         return inner
 
+    def _upload_view(self, action, view):
+        """
+        Wraps view for action with 'upload' parameter. Requests with
+        Content-Length above 'max_size' or without basic permissions are
+        rejected before body is read and uploaded files are written to
+        temporary files by chunks. CSRF check is made after upload
+        handlers are set up, as it reads request body, so view must be
+        exempt from ``CsrfViewMiddleware``.
+        """
+        from django.views.decorators.csrf import csrf_protect
+        options = dict(_upload, **self.get_param(action, 'upload'))
+        view = csrf_protect(view)
+
+        def too_large():
+            return HttpResponse("Request is too large.", status=413)
+
+        def upload_view(request, **kwargs):
+            if request.method in _safe_methods:
+                return view(request, **kwargs)
+            max_size = options['max_size']
+            try:
+                length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                length = 0
+            if max_size is not None and length > max_size:
+                return too_large()
+            perm = self.get_param(action, 'permissions')
+            if perm and not request.user.has_perm(*perm):
+                setattr(request, _action, action)
+                return self.deny(request)
+            if not hasattr(request, '_files'):
+                request.upload_handlers = _upload_handlers(request, options)
+                request.FILES
+                if request.upload_handlers[0].exceeded:
+                    return too_large()
+            return view(request, **kwargs)
+
+        return upload_view
+
+def log_profile(view, request, stats):
+    """
+    Profile sink, which logs pipeline steps stats to 'smarter.profile'
+    logger with DEBUG level.
+    """
+    import logging
+    logging.getLogger('smarter.profile').debug('%s %s: %s', request.method,
+        request.path, ', '.join('%s %.1fms %s queries' % (name, seconds * 1000, queries)
+                                for name, seconds, queries in stats))
+
+
+class ProfileAggregator(object):
+    """
+    Profile sink, which aggregates pipeline steps stats in memory.
+    Stats are stored in ``stats`` dict by (url name, step) keys, values
+    are dicts with 'count', 'time' and 'queries' totals.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def __call__(self, view, request, stats):
+        url_name = view._url_name(getattr(request, _action))
+        with self.lock:
+            for name, seconds, queries in stats:
+                total = self.stats.setdefault((url_name, name),
+                    {'count': 0, 'time': 0.0, 'queries': 0})
+                total['count'] += 1
+                total['time'] += seconds
+                total['queries'] += queries
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+
 def autodiscover():
     """
     Auto-discover INSTALLED_APPS smarter_views modules and fail if
@@ -1,13 +1,18 @@
 """
 Unit tests for django-smarter.
 """
+import json
+import threading
+import time
 from django.conf.urls import patterns, include, url
+from django import forms
 from django.contrib.auth.decorators import login_required
-from django.core.urlresolvers import resolve, reverse, Resolver404
-from django.http import HttpResponse
+from django.core.urlresolvers import resolve, reverse, NoReverseMatch, Resolver404, RegexURLResolver
+from django.http import Http404, HttpResponse
 from django.db import models
 from django.test import TestCase
-from django.test.client import Client
+from django.test.utils import override_settings
+from django.test.client import Client, RequestFactory
 import smarter
 
 # Custom urls for tests
@@ -20,20 +25,69 @@ def handler404(request):
     return HttpResponseNotFound('Not found: %s' % request.path)
 
 
+def _form_data(html):
+    """Returns data submitted by browser for form in HTML, i.e. values
+    of inputs, checked checkboxes and textareas.
+    """
+    from HTMLParser import HTMLParser
+    data = {}
+
+    class Parser(HTMLParser):
+        textarea = None
+
+        def handle_starttag(self, tag, attrs):
+            attrs = dict(attrs)
+            if tag == 'input' and attrs.get('name'):
+                if attrs.get('type') == 'checkbox' and not 'checked' in attrs:
+                    return
+                data.setdefault(attrs['name'], []).append(attrs.get('value', 'on'))
+            elif tag == 'textarea':
+                self.textarea = attrs['name']
+                data[self.textarea] = ['']
+
+        def handle_data(self, text):
+            if self.textarea:
+                data[self.textarea] = [text.strip()]
+
+        def handle_endtag(self, tag):
+            if tag == 'textarea':
+                self.textarea = None
+
+    Parser().feed(html)
+    return data
+
+
 class TestModel(models.Model):
     """Model for tests."""
     text = models.TextField()
     is_published = models.BooleanField(default=True)
+    modified = models.DateTimeField(auto_now=True)
 
     def get_absolute_url(self):
         return ('/test/testmodel/%s/' % self.pk)
 
 
+class ProxyTestModel(TestModel):
+    """Proxy model for tests."""
+    class Meta:
+        proxy = True
+
+
 class AnotherTestModel(models.Model):
     """Well, another model for tests."""
     another_text = models.TextField()
 
 
+class VersionedTestModel(models.Model):
+    """Model with version field and custom save() for tests."""
+    text = models.TextField()
+    version = models.IntegerField(default=0)
+
+    def save(self, *args, **kwargs):
+        self.text = self.text.strip()
+        super(VersionedTestModel, self).save(*args, **kwargs)
+
+
 class TestViews(smarter.GenericViews):
     options = {
         'add': {
@@ -44,6 +98,11 @@ class TestViews(smarter.GenericViews):
         'publish': {
             'url': r'(?P<pk>\d+)/publish/',
             'exclude': ('text',),
+            'json': ('id', 'is_published'),
+        },
+
+        'details': {
+            'json': True,
         },
 
         'details-extended': {
@@ -63,9 +122,119 @@ class TestViews(smarter.GenericViews):
             'form': None,
             'permissions': ('smarter.view_testmodel',)
         },
+
+        'cached': {
+            'url': r'(?P<pk>\d+)/cached/',
+            'form': None,
+            'template': 'smarter/details.html',
+            'cache': {'timeout': 60},
+        },
+
+        'bulk-edit': {
+            'fields': ('is_published',),
+        },
+
+        'bulk-remove': {},
+
+        'export': {
+            'fields': ('text', 'is_published'),
+            'chunk_size': 2,
+        },
+
+        'conditional': {
+            'url': r'(?P<pk>\d+)/conditional/',
+            'form': None,
+            'template': 'smarter/details.html',
+            'last_modified': 'modified',
+        },
+    }
+
+    def cached(self, request, **kwargs):
+        return self.details(request, **kwargs)
+
+    def conditional(self, request, **kwargs):
+        return self.details(request, **kwargs)
+
+
+class CustomizedTestViews(smarter.GenericViews):
+    options = {
+        'add': {
+            'fields': ('text', 'is_published'),
+            'labels': {'text': 'Content'},
+            'widgets': {'text': forms.TextInput},
+            'help_text': {'text': 'Some text here.'},
+            'required': {'text': False},
+        },
+    }
+
+
+class PaginatedTestViews(smarter.GenericViews):
+    options = {
+        'index': {
+            'paginate': {'per_page': 2, 'max_per_page': 3},
+        },
+        'index-keyset': {
+            'url': r'keyset/',
+            'paginate': {'per_page': 2, 'keyset': True},
+            'form': None,
+        },
+    }
+
+    def index_keyset(self, request, **kwargs):
+        return self.index(request, **kwargs)
+
+
+class ConcurrentTestViews(smarter.GenericViews):
+    options = {
+        'details': {
+            'form': None,
+            'pipeline': ('init', '', ('post', 'audit'), 'done'),
+        },
+    }
+
+    def details__post(self, request, **kwargs):
+        return {'post_thread': threading.current_thread().ident}
+
+    def details__audit(self, request, **kwargs):
+        from django.core.urlresolvers import get_script_prefix
+        from django.utils import translation
+        return {'audit_thread': threading.current_thread().ident,
+                'audit_locals': (get_script_prefix(), translation.get_language())}
+
+    def details__done(self, request, **kwargs):
+        return HttpResponse('%(obj)s' % kwargs, status=(
+            kwargs['post_thread'] != kwargs['audit_thread'] and 200 or 500))
+
+
+class RowPermissionsTestViews(smarter.GenericViews):
+    defaults = dict(smarter.GenericViews.defaults,
+        row_permissions=lambda view, request: {'is_published': True})
+
+
+class FilteredTestViews(smarter.GenericViews):
+    options = {
+        'index': {
+            'filters': ('is_published', 'id__in', 'modified__gte'),
+            'search': {'fields': ('text', '=id')},
+            'json': True,
+        },
     }
 
 
+class UploadTestViews(smarter.GenericViews):
+    options = {
+        'add': {
+            'fields': ('text',),
+            'upload': {'max_size': 1024},
+            'redirect': '/test/testmodel/',
+        },
+    }
+
+    def add__save(self, request, form, **kwargs):
+        self.uploaded = request.FILES['file']
+        return form.save()
+
+
 class AnotherTestViews(smarter.GenericViews):
     options = {
         # 'index': None, # Won't be enabled
@@ -108,6 +277,64 @@ class Tests(TestCase):
         #self.assertEqual(len(site.urls), 0)
         #will fail because unregister() is still unimplemented
 
+    def test_site_urls_memoized(self):
+        site = smarter.Site()
+        site.register(TestViews, TestModel)
+        urls = site.urls
+        self.assertTrue(urls is site.urls)
+        self.assertRaises(smarter.AlreadyRegistered, site.register, TestViews, TestModel)
+
+        site.register(AnotherTestViews, AnotherTestModel, base_url='another/')
+        self.assertFalse(urls is site.urls)
+        self.assertEqual(len(site.urls), 2)
+        self.assertEqual(len(site.get_urls(AnotherTestModel)), 1)
+        self.assertEqual(len(site.get_urls(TestViews, AnotherTestViews)), 2)
+        self.assertEqual(len(site._views), 2)
+
+    def test_site_dispatcher(self):
+        site = smarter.Site(dispatcher=True)
+        site.register(TestViews, TestModel)
+        site.register(AnotherTestViews, AnotherTestModel, base_url='/')
+        resolver = RegexURLResolver(r'^/', site.urls)
+
+        self.assertEqual(resolver.resolve('/testmodel/').url_name, 'testmodel-index')
+        self.assertEqual(resolver.resolve('/testmodel/add/').url_name, 'testmodel-add')
+        match = resolver.resolve('/testmodel/1/edit/')
+        self.assertEqual((match.url_name, match.kwargs), ('testmodel-edit', {'pk': '1'}))
+        self.assertEqual(resolver.resolve('/').url_name, 'anothertestmodel-index')
+        self.assertEqual(resolver.resolve('/2/').url_name, 'anothertestmodel-details')
+        self.assertRaises(Resolver404, resolver.resolve, '/testmodel/lalala/')
+
+        self.assertEqual(resolver.reverse('testmodel-edit', pk=1), 'testmodel/1/edit/')
+        self.assertEqual(resolver.reverse('anothertestmodel-index'), '')
+
+        # Same result as standard resolver for alternatives and flags
+        self.assertEqual(smarter._literal_prefix(r'^page/(?P<pk>\d+)/'), 'page/')
+        self.assertEqual(smarter._literal_prefix(r'^(edit|change)/'), '')
+        self.assertEqual(smarter._literal_prefix(r'^edit|change/'), '')
+        self.assertEqual(smarter._literal_prefix(r'^a[|(]b/'), 'a')
+        self.assertEqual(smarter._literal_prefix(r'^(?i)page/'), '')
+        view = lambda request: HttpResponse()
+        resolver = smarter.DispatchResolver(r'^/', [url(r'^edit|change/', view, name='edit'),
+                                                    url(r'^(?i)page/', view, name='page')])
+        self.assertEqual(resolver.resolve('/change/').url_name, 'edit')
+        self.assertEqual(resolver.resolve('/PAGE/').url_name, 'page')
+
+    def test_url_templates(self):
+        self.assertEqual(smarter._url_template(r'(?P<pk>\d+)/edit/')[0], '%(pk)s/edit/')
+        self.assertEqual(smarter._url_template(r'^a\.b%/$')[0], 'a.b%%/')
+        self.assertEqual(smarter._url_template(r'(edit|change)/'), None)
+
+        self.site.get_urls()
+        views = self.site._views[(TestModel, TestViews)]
+        self.assertEqual(views.get_url('edit', pk=5), '/test/testmodel/5/edit/')
+        self.assertEqual(views._url_prefixes.values(), ['/test/'])
+        self.assertEqual(views.get_url('details', pk=6), '/test/testmodel/6/')
+        self.assertEqual(views.get_url('index'), '/test/testmodel/')
+        self.assertEqual(views.get_url('edit', 7), '/test/testmodel/7/edit/')
+        self.assertRaises(NoReverseMatch, views.get_url, 'edit', pk='lalala')
+        self.assertRaises(NoReverseMatch, views.get_url, 'edit', id=5)
+
     def test_urls_reversing(self):
         reverse('testmodel-index')
         reverse('testmodel-add')
@@ -167,6 +394,88 @@ class Tests(TestCase):
         self.client.post('/test/testmodel/200/remove/')
         self._test_url('/test/testmodel/200/', 404) # POST can!
 
+    def test_bulk_actions(self):
+        TestModel.objects.create(id=2, text='The second object.')
+        TestModel.objects.create(id=3, text='The third object.')
+        self._test_url('/test/testmodel/bulk-edit/?pk=1&pk=2')
+        self._test_url('/test/testmodel/bulk-remove/?pk=1&pk=2')
+        self._test_url('/test/testmodel/bulk-remove/?pk=lalala', 404)
+        self._test_url('/test/another/bulk-remove/', 404) # optional
+
+        # Not chosen and not changed fields are not updated
+        r = self.client.post('/test/testmodel/bulk-edit/', {'pk': [1, 2]})
+        self.assertRedirects(r, '/test/testmodel/')
+        self.assertEqual(TestModel.objects.filter(is_published=True).count(), 3)
+
+        r = self.client.post('/test/testmodel/bulk-edit/', {'pk': [1, 2], 'update': 'is_published'})
+        self.assertRedirects(r, '/test/testmodel/')
+        self.assertEqual(list(TestModel.objects.filter(is_published=True)
+                                               .values_list('pk', flat=True)), [3])
+        self.assertEqual(TestModel.objects.get(pk=2).text, 'The second object.')
+
+        # Submitted default template updates only chosen fields
+        views = TestViews(model=TestModel, prefix='testmodel', delim='-')
+        views._options['bulk-edit']['fields'] = ('text', 'is_published')
+        r = views._view('bulk-edit')(RequestFactory().get('/test/testmodel/bulk-edit/?pk=1&pk=2'))
+        data = _form_data(r.content)
+        self.assertEqual(sorted(data), ['is_published', 'pk', 'text'])
+        request = RequestFactory().post('/test/testmodel/bulk-edit/', data)
+        self.assertEqual(views._view('bulk-edit')(request).status_code, 302)
+        self.assertEqual(TestModel.objects.get(pk=2).text, 'The second object.')
+        self.assertFalse(TestModel.objects.get(pk=2).is_published)
+
+        data.update(text='Updated.', update='text')
+        request = RequestFactory().post('/test/testmodel/bulk-edit/', data)
+        self.assertEqual(views._view('bulk-edit')(request).status_code, 302)
+        self.assertEqual(TestModel.objects.get(pk=2).text, 'Updated.')
+        self.assertFalse(TestModel.objects.get(pk=2).is_published)
+
+        views._options['bulk-edit']['form'] = None
+        request = RequestFactory().post('/test/testmodel/bulk-edit/', {'pk': [1, 2]})
+        self.assertEqual(views._view('bulk-edit')(request).status_code, 200)
+
+        r = self.client.post('/test/testmodel/bulk-remove/', {'pk': [2, 3]})
+        self.assertRedirects(r, '/test/testmodel/')
+        self.assertEqual(list(TestModel.objects.values_list('pk', flat=True)), [1])
+
+    def test_export(self):
+        import json
+        TestModel.objects.create(id=2, text=u'The second, "quoted" object.')
+        TestModel.objects.create(id=3, text=u'The third object.', is_published=False)
+
+        r = self.client.get('/test/testmodel/export/')
+        self.assertEqual(r['Content-Disposition'], 'attachment; filename="testmodel.csv"')
+        self.assertEqual(''.join(r.streaming_content).splitlines(), [
+            'text,is_published',
+            'The first object.,True',
+            '"The second, ""quoted"" object.",True',
+            'The third object.,False'])
+
+        r = self.client.get('/test/testmodel/export/?format=json')
+        rows = [json.loads(line) for line in r.streaming_content]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[2], {'text': 'The third object.', 'is_published': False})
+
+        self._test_url('/test/testmodel/export/?format=xml', 404)
+
+    def test_json_response(self):
+        import json
+        r = self.client.get('/test/testmodel/1/?format=json')
+        self.assertEqual(r['Content-Type'], 'application/json')
+        data = json.loads(r.content)
+        self.assertEqual(data['obj']['text'], 'The first object.')
+        self.assertEqual(sorted(data['obj']), ['id', 'is_published', 'modified', 'text'])
+
+        r = self.client.get('/test/testmodel/1/', HTTP_ACCEPT='application/json')
+        self.assertEqual(json.loads(r.content)['obj']['id'], 1)
+        r = self.client.get('/test/testmodel/1/edit/', HTTP_ACCEPT='application/json')
+        self.assertEqual(r['Content-Type'], 'text/html; charset=utf-8')
+
+        r = self.client.post('/test/testmodel/1/publish/?format=json',
+                             {'is_published': ''})
+        self.assertEqual(json.loads(r.content), {
+            'obj': {'id': 1, 'is_published': False}, 'form_saved': True})
+
     def test_decorated_view(self):
         with self.settings(LOGIN_URL='/test/testmodel/'):
             r = self.client.get('/test/testmodel/1/decorated/')
@@ -179,6 +488,576 @@ class Tests(TestCase):
     def test_permissions(self):
         self._test_url('/test/testmodel/1/protected/', 403)
 
+    def test_response_cache(self):
+        from django.core.cache import cache
+        cache.clear()
+        obj = TestModel.objects.create(id=300, text='Cache me!')
+        TestModel.objects.create(id=301, text='Cache me too!')
+        with self.assertNumQueries(1):
+            self._test_url('/test/testmodel/300/cached/')
+        with self.assertNumQueries(1):
+            self._test_url('/test/testmodel/301/cached/')
+        with self.assertNumQueries(0):
+            self._test_url('/test/testmodel/300/cached/')
+            self._test_url('/test/testmodel/301/cached/')
+
+        # Only saved object is invalidated
+        obj.save()
+        with self.assertNumQueries(1):
+            self._test_url('/test/testmodel/300/cached/')
+        with self.assertNumQueries(0):
+            self._test_url('/test/testmodel/301/cached/')
+
+        # Invalidated for not normalized pk in URL and for proxy model
+        self._test_url('/test/testmodel/0301/cached/')
+        views = TestViews(model=ProxyTestModel, prefix='proxytestmodel', delim='-')
+        request = RequestFactory().get('/test/proxytestmodel/301/cached/')
+        views._view('cached')(request, pk='301')
+        TestModel.objects.get(pk=301).save()
+        with self.assertNumQueries(1):
+            self._test_url('/test/testmodel/0301/cached/')
+        with self.assertNumQueries(1):
+            request = RequestFactory().get('/test/proxytestmodel/301/cached/')
+            views._view('cached')(request, pk='301')
+
+        obj.delete()
+        self._test_url('/test/testmodel/300/cached/', 404)
+
+    def test_response_cache_custom_perm(self):
+        from django.contrib.auth.models import AnonymousUser, User
+        from django.core.exceptions import PermissionDenied
+
+        def deny_non_staff(self, request, **kwargs):
+            if not request.user.is_staff:
+                return self.deny(request)
+
+        class StaffTestViews(smarter.GenericViews):
+            options = {'details': {'cache': {'timeout': 60}}}
+            details__perm = deny_non_staff
+
+        class StaffPipeTestViews(smarter.GenericViews):
+            options = {'details': {'cache': {'timeout': 60}}}
+            _pipe__perm = deny_non_staff
+
+        for views_class in (StaffTestViews, StaffPipeTestViews):
+            smarter._get_cache('default').clear()
+            views = views_class(model=TestModel, prefix='testmodel', delim='-')
+            request = RequestFactory().get('/test/testmodel/1/')
+            request.user = User.objects.get_or_create(username='staff', is_staff=True)[0]
+            self.assertEqual(views._view('details')(request, pk=1).status_code, 200)
+            request = RequestFactory().get('/test/testmodel/1/')
+            request.user = AnonymousUser()
+            self.assertRaises(PermissionDenied, views._view('details'), request, pk=1)
+
+    def test_conditional_get(self):
+        r = self.client.get('/test/testmodel/1/conditional/')
+        self.assertEqual(r.status_code, 200)
+        last_modified = r['Last-Modified']
+        with self.assertNumQueries(1):
+            r = self.client.get('/test/testmodel/1/conditional/',
+                                HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(r.status_code, 304)
+        r = self.client.get('/test/testmodel/1/conditional/',
+                            HTTP_IF_MODIFIED_SINCE='Sat, 01 Jan 2000 00:00:00 GMT')
+        self.assertEqual(r.status_code, 200)
+        self._test_url('/test/testmodel/100/conditional/', 404)
+
+    def test_conditional_get_list(self):
+        views = TestViews(model=TestModel, prefix='testmodel', delim='-')
+        views._options['index']['last_modified'] = 'modified'
+        view = views._view('index')
+        r = view(RequestFactory().get('/test/testmodel/'))
+        self.assertEqual(r.status_code, 200)
+        r = view(RequestFactory().get('/test/testmodel/', HTTP_IF_NONE_MATCH=r['ETag']))
+        self.assertEqual(r.status_code, 304)
+        TestModel.objects.create(id=100, text='Lalala!')
+        r = view(RequestFactory().get('/test/testmodel/', HTTP_IF_NONE_MATCH=r['ETag']))
+        self.assertEqual(r.status_code, 200)
+
+    def test_conditional_get_custom_perm(self):
+        from django.core.exceptions import PermissionDenied
+
+        class PipePermTestViews(smarter.GenericViews):
+            options = {'details': {'etag': lambda view, request, **kwargs: kwargs['obj'].text}}
+
+            def _pipe__perm(self, request, **kwargs):
+                if kwargs['obj'].pk != 1:
+                    return self.deny(request)
+
+        # Checked after perm step with loaded object
+        TestModel.objects.create(id=2, text='Private.')
+        view = PipePermTestViews(model=TestModel, prefix='testmodel', delim='-')._view('details')
+        r = view(RequestFactory().get('/test/testmodel/1/'), pk=1)
+        self.assertEqual(r['ETag'], '"The first object."')
+        r = view(RequestFactory().get('/test/testmodel/1/', HTTP_IF_NONE_MATCH=r['ETag']), pk=1)
+        self.assertEqual(r.status_code, 304)
+        self.assertRaises(PermissionDenied, view, RequestFactory().get(
+            '/test/testmodel/2/', HTTP_IF_NONE_MATCH='"Private."'), pk=2)
+
+    def test_templates_cache(self):
+        views = TestViews(model=TestModel, prefix='testmodel', delim='-')
+        view = views._view('details')
+        self.assertEqual(view(RequestFactory().get('/test/testmodel/1/'), pk=1).status_code, 200)
+        template = views._templates[('details', False)]
+        self.assertEqual(template.name, 'smarter/details.html')
+        view(RequestFactory().get('/test/testmodel/1/'), pk=1)
+        self.assertTrue(template is views._templates[('details', False)])
+
+        with self.settings(DEBUG=True):
+            views._templates.clear()
+            view(RequestFactory().get('/test/testmodel/1/'), pk=1)
+            self.assertEqual(views._templates, {})
+
+    def test_concurrent_pipeline(self):
+        views = ConcurrentTestViews(model=TestModel, prefix='testmodel', delim='-')
+        r = views._view('details')(RequestFactory().get('/test/testmodel/1/'), pk=1)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.content, 'TestModel object')
+
+        # Threads get request script prefix and language
+        from django.core.urlresolvers import get_script_prefix, set_script_prefix
+        from django.utils import translation
+        result, old_prefix = {}, get_script_prefix()
+        views.details__done = lambda request, **kwargs: result.update(kwargs) or HttpResponse()
+        views.compile_pipeline()
+        set_script_prefix('/app/')
+        translation.activate('de')
+        try:
+            views._view('details')(RequestFactory().get('/test/testmodel/1/'), pk=1)
+        finally:
+            set_script_prefix(old_prefix)
+            translation.deactivate()
+        self.assertEqual(result['audit_locals'], ('/app/', 'de'))
+
+    def test_profiling(self):
+        profile = smarter.ProfileAggregator()
+        views = TestViews(model=TestModel, prefix='testmodel', delim='-')
+        views._options['edit']['profile'] = profile
+        views._options['edit']['server_timing'] = True
+        view = views._view('edit')
+
+        r = view(RequestFactory().get('/test/testmodel/1/edit/'), pk=1)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([m.split(';')[0] for m in r['Server-Timing'].split(', ')],
+                         ['init', 'edit', 'perm', 'form', 'post', 'done'])
+        self.assertEqual(profile.stats[('testmodel-edit', 'edit')]['queries'], 1)
+
+        view(RequestFactory().post('/test/testmodel/1/edit/', {'text': 'Lalala!'}), pk=1)
+        self.assertEqual(profile.stats[('testmodel-edit', 'edit')]['count'], 2)
+        self.assertEqual(profile.stats[('testmodel-edit', 'done')]['count'], 2)
+        self.assertTrue(profile.stats[('testmodel-edit', 'form')]['queries'] >= 1)
+
+    def test_objects_request_cache(self):
+        views = TestViews(model=TestModel, prefix='testmodel', delim='-')
+        another_views = CustomizedTestViews(model=TestModel, prefix='testmodel', delim='-')
+        request = RequestFactory().get('/test/testmodel/1/')
+        setattr(request, smarter._action, 'details')
+        with self.assertNumQueries(1):
+            obj = views.get_object(request, pk='1')
+            self.assertTrue(obj is views.get_object(request, pk=1))
+            self.assertTrue(obj is another_views.get_object(request, id=1))
+        with self.assertNumQueries(1):
+            views.get_object('details', pk=1)
+
+        request = RequestFactory().post('/test/testmodel/1/remove/')
+        views._view('remove')(request, pk=1)
+        self.assertRaises(Http404, views.get_object, request, pk=1)
+
+    def test_object_cache(self):
+        smarter._get_cache('default').clear()
+        views = TestViews(model=TestModel, prefix='testmodel', delim='-')
+        for action in ('details', 'publish'):
+            views._options[action]['object_cache'] = {'timeout': 60}
+
+        def get(action):
+            request = RequestFactory().get('/test/testmodel/1/')
+            setattr(request, smarter._action, action)
+            return views.get_object(request, pk='1')
+
+        with self.assertNumQueries(1):
+            get('details')
+        with self.assertNumQueries(0):
+            self.assertEqual(get('details').text, 'The first object.')
+            get('publish')
+
+        TestModel.objects.filter(pk=1).update(text='Updated.')
+        with self.assertNumQueries(0):
+            self.assertEqual(get('details').text, 'The first object.')
+
+        # Invalidated on save
+        TestModel.objects.get(pk=1).save()
+        with self.assertNumQueries(1):
+            self.assertEqual(get('details').text, 'Updated.')
+
+        # Generations expire with cached data
+        cache = smarter._get_cache('default')
+        key = cache.make_key(smarter._generation_key(TestModel, 1))
+        self.assertTrue(cache._expire_info[key] <= time.time() + 60)
+
+        # Invalidated in processes which never created views only
+        # with SMARTER_CACHE_ALIASES setting
+        get('details')
+        aliases = smarter._cached_models.pop(TestModel)
+        try:
+            TestModel.objects.get(pk=1).save()
+            with self.assertNumQueries(0):
+                get('details')
+            with override_settings(SMARTER_CACHE_ALIASES=('default',)):
+                TestModel.objects.get(pk=1).save()
+            with self.assertNumQueries(1):
+                get('details')
+        finally:
+            smarter._cached_models[TestModel] = aliases
+
+
+        # Aliases are registered on views registration
+        class OtherCacheTestViews(smarter.GenericViews):
+            options = {'details': {'object_cache': {'alias': 'other'}}}
+        smarter.Site().register(OtherCacheTestViews, AnotherTestModel)
+        self.assertTrue('other' in smarter._cached_models.pop(AnotherTestModel))
+
+        # Not invalidated for models without cache
+        AnotherTestModel.objects.create(another_text='Uncached')
+        self.assertEqual(cache.get(smarter._generation_key(AnotherTestModel)), None)
+
+        # Not cached for unsafe requests and not configured actions
+        request = RequestFactory().post('/test/testmodel/1/')
+        setattr(request, smarter._action, 'details')
+        with self.assertNumQueries(1):
+            views.get_object(request, pk=1)
+        with self.assertNumQueries(1):
+            get('edit')
+
+    def test_update_fields(self):
+        views = TestViews(model=TestModel, prefix='testmodel', delim='-')
+        views._options['edit']['update_fields'] = True
+        saved = []
+
+        def on_save(sender, **kwargs):
+            saved.append(kwargs['update_fields'])
+        models.signals.post_save.connect(on_save, sender=TestModel)
+        try:
+            request = RequestFactory().post('/test/testmodel/1/edit/',
+                {'text': 'The first object.', 'is_published': 'on'})
+            with self.assertNumQueries(1):
+                r = views._view('edit')(request, pk=1)
+            self.assertEqual(r.status_code, 302)
+            self.assertEqual(saved, [])
+
+            request = RequestFactory().post('/test/testmodel/1/edit/',
+                {'text': 'Edited.', 'is_published': 'on'})
+            views._view('edit')(request, pk=1)
+            self.assertEqual(saved, [frozenset(['text', 'modified'])])
+            self.assertEqual(TestModel.objects.get(pk=1).text, 'Edited.')
+        finally:
+            models.signals.post_save.disconnect(on_save, sender=TestModel)
+
+    def test_version_conflict(self):
+        obj = VersionedTestModel.objects.create(text='Version 0.')
+        views = smarter.GenericViews(model=VersionedTestModel, prefix='versioned', delim='-')
+        views._options['edit'].update(version_field='version', json=True,
+                                       redirect='/test/versioned/')
+
+        request = RequestFactory().get('/test/versioned/%s/edit/' % obj.pk)
+        r = views._view('edit')(request, pk=obj.pk)
+        self.assertTrue('name="version" type="hidden" value="0"' in r.content)
+
+        request = RequestFactory().post('/test/versioned/%s/edit/' % obj.pk,
+                                        {'text': ' Version 1. ', 'version': 0})
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            r = views._view('edit')(request, pk=obj.pk)
+        self.assertEqual(r.status_code, 302)
+        self.assertEqual(len([q for q in queries if 'UPDATE' in q['sql']]), 2)
+        obj = VersionedTestModel.objects.get(pk=obj.pk)
+        self.assertEqual((obj.text, obj.version), ('Version 1.', 1))
+
+        # Concurrent edit for old version
+        request = RequestFactory().post('/test/versioned/%s/edit/?format=json' % obj.pk,
+                                        {'text': 'Version 0 edited.', 'version': 0})
+        r = views._view('edit')(request, pk=obj.pk)
+        self.assertEqual(r.status_code, 409)
+        self.assertTrue('__all__' in json.loads(r.content)['errors'])
+        obj = VersionedTestModel.objects.get(pk=obj.pk)
+        self.assertEqual((obj.text, obj.version), ('Version 1.', 1))
+
+        # New objects are added with default version
+        class VersionedTestViews(smarter.GenericViews):
+            defaults = dict(smarter.GenericViews.defaults, version_field='version')
+        views = VersionedTestViews(model=VersionedTestModel, prefix='versioned', delim='-')
+        views._options['add']['redirect'] = '/test/versioned/'
+        r = views._view('add')(RequestFactory().get('/test/versioned/add/'))
+        self.assertFalse('name="version"' in r.content)
+        request = RequestFactory().post('/test/versioned/add/', {'text': 'Added.'})
+        self.assertEqual(views._view('add')(request).status_code, 302)
+        obj = VersionedTestModel.objects.get(text='Added.')
+        self.assertEqual(obj.version, 0)
+
+    def test_upload(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+        views = UploadTestViews(model=TestModel, prefix='testmodel', delim='-')
+
+        def post(size, csrf=False):
+            request = RequestFactory().post('/test/testmodel/add/', {'text': 'Uploaded.',
+                'file': SimpleUploadedFile('file.txt', 'x' * size)})
+            request._dont_enforce_csrf_checks = not csrf
+            return views._view('add')(request)
+
+        r = post(100)
+        self.assertEqual(r.status_code, 302)
+        self.assertTrue(isinstance(views.uploaded, TemporaryUploadedFile))
+        self.assertEqual(views.uploaded.read(), 'x' * 100)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(post(2048).status_code, 413)
+        self.assertEqual(post(100, csrf=True).status_code, 403)
+        self.assertTrue(views._view('add').csrf_exempt)
+
+        # Decorators and basic permissions are checked before upload
+        from django.contrib.auth.models import AnonymousUser, User
+        from django.core.exceptions import PermissionDenied
+        views._options['add']['decorators'] = (login_required,)
+        request = RequestFactory().post('/test/testmodel/add/', {'file':
+            SimpleUploadedFile('file.txt', 'x' * 100)})
+        request.user = AnonymousUser()
+        self.assertEqual(views._view('add')(request).status_code, 302)
+        self.assertFalse(hasattr(request, '_files'))
+
+        views._options['add']['permissions'] = ('smarter.add_testmodel',)
+        request.user = User.objects.create(username='user')
+        self.assertRaises(PermissionDenied, views._view('add'), request)
+        self.assertFalse(hasattr(request, '_files'))
+
+    def test_row_permissions(self):
+        from django.core.exceptions import PermissionDenied
+        from django.db.models import Q
+        TestModel.objects.create(id=2, text='Unpublished.', is_published=False)
+        views = RowPermissionsTestViews(model=TestModel, prefix='testmodel', delim='-')
+
+        request = RequestFactory().get('/test/testmodel/')
+        setattr(request, smarter._action, 'index')
+        self.assertEqual([o.pk for o in views.get_objects_list(request)], [1])
+
+        # Not checked without request
+        views._options['index']['row_permissions'] = (
+            lambda view, request: {'is_published': not request.user.is_staff})
+        self.assertEqual(views.get_row_permissions('index'), None)
+        self.assertEqual([o.pk for o in views.get_objects_list('index')], [1, 2])
+        del views._options['index']['row_permissions']
+
+        with self.assertNumQueries(1):
+            self.assertRaises(PermissionDenied, views._view('details'),
+                              RequestFactory().get('/test/testmodel/2/'), pk=2)
+        r = views._view('details')(RequestFactory().get('/test/testmodel/1/'), pk=1)
+        self.assertEqual(r.status_code, 200)
+
+        # Cached responses are not shared by users with different permissions
+        from django.contrib.auth.models import User
+        staff = User.objects.create(username='staff', is_staff=True)
+        user = User.objects.create(username='user')
+        views._options['details']['row_permissions'] = (
+            lambda view, request: not request.user.is_staff and {'is_published': True} or None)
+        views._options['details']['cache'] = {'timeout': 60}
+        view = views._view('details')
+        for u in (staff, user):
+            request = RequestFactory().get('/test/testmodel/2/')
+            request.user = u
+            if u.is_staff:
+                self.assertEqual(view(request, pk=2).status_code, 200)
+            else:
+                self.assertRaises(PermissionDenied, view, request, pk=2)
+        del views._options['details']['cache']
+
+        # Complex lookups are checked by query
+        views._options['details']['row_permissions'] = (
+            lambda view, request: Q(is_published=True) | Q(text__startswith='Un'))
+        r = views._view('details')(RequestFactory().get('/test/testmodel/2/'), pk=2)
+        self.assertEqual(r.status_code, 200)
+
+    def test_filters_and_search(self):
+        TestModel.objects.create(id=2, text='Unpublished text.', is_published=False)
+        TestModel.objects.create(id=3, text='Another text.')
+        views = FilteredTestViews(model=TestModel, prefix='testmodel', delim='-')
+
+        def pks(query):
+            request = RequestFactory().get('/test/testmodel/?' + query)
+            setattr(request, smarter._action, 'index')
+            return sorted(o.pk for o in views.get_objects_list(request))
+
+        self.assertEqual(pks(''), [1, 2, 3])
+        self.assertEqual(pks('is_published=false'), [2])
+        self.assertEqual(pks('id__in=1,2&id__in=3&is_published=true'), [1, 3])
+        self.assertEqual(pks('q=text'), [2, 3])
+        self.assertEqual(pks('q=TEXT+another'), [3])
+        self.assertEqual(pks('q=3'), [3])
+
+        r = views._view('index')(RequestFactory().get('/test/testmodel/?id__in=x&format=json'))
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(json.loads(r.content), {'errors': {'id__in': ['Invalid value.']}})
+
+        # Strict mode rejects lookups which can't use index
+        class StrictTestViews(FilteredTestViews):
+            defaults = dict(FilteredTestViews.defaults, strict_filters=True)
+        self.assertRaises(Exception, StrictTestViews,
+                          model=TestModel, prefix='testmodel', delim='-')
+
+        StrictTestViews.options = {'index': {
+            'filters': ('id__in',),
+            'search': {'param': 'text', 'backend': lambda view, request, queryset, query:
+                       queryset.filter(text__startswith=query)},
+        }}
+        views = StrictTestViews(model=TestModel, prefix='testmodel', delim='-')
+        self.assertEqual(pks('text=Another'), [3])
+
+    def test_using_replica(self):
+        views = TestViews(model=TestModel, prefix='testmodel', delim='-', using='replica')
+        views._options['edit']['read_your_writes'] = 10
+
+        request = RequestFactory().get('/test/testmodel/1/edit/')
+        setattr(request, smarter._action, 'edit')
+        self.assertEqual(views.get_queryset(request).db, 'replica')
+        self.assertEqual(views.get_queryset('index').db, 'replica')
+
+        request = RequestFactory().post('/test/testmodel/1/edit/', {'text': 'Edited.'})
+        setattr(request, smarter._action, 'edit')
+        self.assertEqual(views.get_queryset(request).db, 'default')
+        r = views._view('edit')(request, pk=1)
+        self.assertEqual(r.status_code, 302)
+        self.assertEqual(r.cookies[smarter._primary_cookie]['max-age'], 10)
+
+        # Read-your-writes window after saving
+        request = RequestFactory().get('/test/testmodel/1/')
+        request.COOKIES[smarter._primary_cookie] = '1'
+        setattr(request, smarter._action, 'details')
+        self.assertEqual(views.get_queryset(request).db, 'default')
+
+        views._options['details']['using'] = None
+        request = RequestFactory().get('/test/testmodel/1/')
+        setattr(request, smarter._action, 'details')
+        self.assertEqual(views.get_queryset(request).db, 'default')
+
+    def test_compiled_pipeline(self):
+        views = TestViews(model=TestModel, prefix='testmodel', delim='-')
+        self.assertEqual(views._compiled['edit'][0], views._pipe__init)
+        self.assertEqual(views._compiled['edit'][1], views._pipe)
+
+        views.edit = lambda request, **kwargs: HttpResponse('Patched!')
+        self.assertEqual(views._compiled['edit'][1], views._pipe)
+        views.compile_pipeline('edit')
+        self.assertEqual(views._compiled['edit'][1], views.edit)
+
+    def test_form_class_cache(self):
+        views = TestViews(model=TestModel, prefix='testmodel', delim='-')
+        form_class = views.get_form_class('add')
+        self.assertTrue(form_class is views.get_form_class('add'))
+        self.assertFalse(form_class is views.get_form_class('edit'))
+        self.assertEqual(list(form_class.base_fields), ['text'])
+        self.assertEqual(views.get_form_class('details-extended'), None)
+
+    def test_form_class_customized(self):
+        views = CustomizedTestViews(model=TestModel, prefix='testmodel', delim='-')
+        form_class = views.get_form_class('add')
+        self.assertTrue(form_class is views.get_form_class('add'))
+        field = form_class.base_fields['text']
+        self.assertEqual(field.label, 'Content')
+        self.assertEqual(field.help_text, 'Some text here.')
+        self.assertFalse(field.required)
+        self.assertTrue(isinstance(field.widget, forms.TextInput))
+        self.assertTrue(form_class().is_bound is False)
+        self.assertTrue(form_class(data={}).is_valid())
+
+        # Fields added in form's __init__ are overridden per-instance
+        class ExtraFieldForm(forms.ModelForm):
+            def __init__(self, *args, **kwargs):
+                super(ExtraFieldForm, self).__init__(*args, **kwargs)
+                self.fields['extra'] = forms.CharField()
+        views._options['add'].update(form=ExtraFieldForm,
+                                     labels={'text': 'Content', 'extra': 'Extra'})
+        form = views.get_form_class('add')()
+        self.assertEqual(form.fields['extra'].label, 'Extra')
+        self.assertEqual(form.fields['text'].label, 'Content')
+        views._options['add']['labels'] = {'missing': 'Missing'}
+        views._form_classes.clear()
+        form_class = views.get_form_class('add')
+        self.assertRaises(Exception, form_class)
+
+        # Base model form fields are untouched
+        field = views.get_form_class('edit').base_fields['text']
+        self.assertTrue(field.required)
+        self.assertTrue(isinstance(field.widget, forms.Textarea))
+
+    def _get_page(self, views, action, path):
+        request = RequestFactory().get(path)
+        setattr(request, smarter._action, action)
+        return views.get_objects_page(request, TestModel.objects.all())
+
+    def test_queryset_options(self):
+        class QuerysetTestViews(smarter.GenericViews):
+            options = {
+                'details': {'only': ('text',)},
+                'index': {'defer': ('text',), 'select_related': True},
+            }
+        views = QuerysetTestViews(model=TestModel, prefix='testmodel', delim='-')
+        self.assertEqual(views.get_object('details', pk=1).text, 'The first object.')
+        queryset = views.get_queryset('details')
+        self.assertEqual(queryset.query.deferred_loading, (set(['text']), False))
+        queryset = views.get_objects_list('index')
+        self.assertTrue(queryset.query.select_related)
+        self.assertEqual(queryset.query.deferred_loading, (set(['text']), True))
+
+    def test_max_queries_warning(self):
+        import warnings
+        views = TestViews(model=TestModel, prefix='testmodel', delim='-')
+        views._options['index']['max_queries'] = 0
+        with self.settings(DEBUG=True):
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                request = RequestFactory().get('/test/testmodel/')
+                views._view('index')(request)
+        self.assertEqual(len(caught), 1)
+        self.assertTrue(issubclass(caught[0].category, smarter.TooManyQueries))
+
+    def test_offset_pagination(self):
+        from django.http import Http404
+        for i in range(2, 6):
+            TestModel.objects.create(id=i, text='Object %s.' % i)
+        views = PaginatedTestViews(model=TestModel, prefix='testmodel', delim='-')
+
+        page = self._get_page(views, 'index', '/')
+        self.assertEqual([o.pk for o in page['objects_list']], [1, 2])
+        self.assertEqual(page['next_page'], '?page=2')
+        self.assertEqual(page['prev_page'], None)
+
+        page = self._get_page(views, 'index', '/?page=2&per_page=10')
+        self.assertEqual([o.pk for o in page['objects_list']], [4, 5])
+        self.assertEqual(page['prev_cursor'], 1)
+
+        self.assertRaises(Http404, self._get_page, views, 'index', '/?page=10')
+
+    def test_keyset_pagination(self):
+        for i in range(2, 6):
+            TestModel.objects.create(id=i, text='Object %s.' % i)
+        views = PaginatedTestViews(model=TestModel, prefix='testmodel', delim='-')
+
+        page = self._get_page(views, 'index-keyset', '/')
+        self.assertEqual([o.pk for o in page['objects_list']], [1, 2])
+        self.assertEqual(page['next_page'], '?after=2')
+        self.assertEqual(page['prev_page'], None)
+
+        page = self._get_page(views, 'index-keyset', '/?after=2')
+        self.assertEqual([o.pk for o in page['objects_list']], [3, 4])
+        self.assertEqual((page['prev_cursor'], page['next_cursor']), (3, 4))
+
+        page = self._get_page(views, 'index-keyset', '/?after=4')
+        self.assertEqual([o.pk for o in page['objects_list']], [5])
+        self.assertEqual(page['next_page'], None)
+
+        page = self._get_page(views, 'index-keyset', '/?before=3')
+        self.assertEqual([o.pk for o in page['objects_list']], [1, 2])
+        self.assertEqual(page['prev_page'], None)
+        self.assertEqual(page['next_page'], '?after=2')
+
 
 class TestSingletonSite(TestCase):
     def test_singleton_site_exists(self):